@@ -15,35 +15,87 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>
 import argparse
+import calibration
 import call_nanotts
+import call_ssocr
+import change_detector
 import cv2
-import feat_detector
-import image_preprocessor
+import device_profile
+import drift_monitor
+import frame_scheduler
+import metrics
 import opencv_webcam_multithread
+import replay
+import result_buffer
 import result_processor
-import roi_cutter
 import sdnotify
-import ssocr
+import seven_segment
+import speech_cache
+import speech_concat
+import speech_queue
+import staged_pipeline
 import sys
+import temporal_vote
+import threading
+import time
 
 
 class Ansprakon:
-    def __init__(self, args):
-        # cam setup
+    # processing steps of a frame, in order
+    STAGES = ("preprocess_image", "cut_rois", "run_ssocr", "detect_feat", "process_result", "speak_result")
+    # the stages run by another process in the staged pipeline, and those that stay in this one
+    VISION_STAGES = STAGES[:2]
+    RESULT_STAGES = STAGES[2:]
+
+    def __init__(self, args, cam=None, speech=None):
+        """
+        :param args: parsed arguments of build_parser()
+        :param cam: started stream to read from, None to open the cam (or the video) of args
+        :param speech: SpeechQueue to speak with, None to start one, see start_speech()
+        """
+        # cam setup, a recorded video replaces the cam in replay mode
         self._cam_index = args.cam
-        self._cam = opencv_webcam_multithread.WebcamVideoStream(src=self._cam_index).start()
+        self._replay = args.replay is not None
+        if cam is not None:
+            self._cam = cam
+        elif self._replay:
+            self._cam = replay.VideoFileStream(args.replay)
+        else:
+            self._cam = opencv_webcam_multithread.WebcamVideoStream(src=self._cam_index, mode=args.capture_mode,
+                                                                    fps=args.fps).start()
         self._device_id = args.device
+        # queued texts of this pipeline only replace each other, not those of other pipelines of a supervisor
+        self._speech_key = "{}@{}".format(self._device_id, self._cam_index)
+        self._pipeline = device_profile.load(self._device_id, args.profiles)
+        # the display position of the last --calibrate is folded into the remap tables of the device
+        self._calibration = calibration.Calibration(calibration.path_for(args))
+        self._pipeline.set_correction(self._calibration.correction())
+        self._drift_monitor = None
+        if args.drift_interval:
+            self._drift_monitor = drift_monitor.DriftMonitor(args.drift_interval, args.drift_tolerance)
+        if args.change_sensitivity is not None:
+            self._pipeline.change_detector = change_detector.RoiChangeDetector(args.change_sensitivity,
+                                                                               args.refresh_interval)
+        # lower the frame rate while the display does not change, every frame is processed in replay mode
+        min_rate = args.min_rate if args.min_rate is not None else self._pipeline.min_rate
+        max_rate = args.max_rate if args.max_rate is not None else self._pipeline.max_rate
+        self._scheduler = None
+        if (min_rate or max_rate) and not self._replay:
+            self._scheduler = frame_scheduler.AdaptiveScheduler(min_rate, max_rate)
+        self._rois_changed = False
         self._final_result = args.final
         self._speak_on_button = args.button
-        self._mute = args.mute
+        # no speech and no GPIO in replay mode
+        self._mute = args.mute or self._replay
+        # confidence weighted voting over the last frames decides the final result instead of the counts
+        self._voter = temporal_vote.TemporalVoter(args.vote, args.buffer[0]) if args.vote is not None else None
+        self._vote_stable = False
 
         # flags for nanoTTS
-        self._nanotts_options = ["-v", args.language,
-                                 "--speed", args.speed,
-                                 "--pitch", args.pitch,
-                                 "--volume", args.volume]
+        self._nanotts_options = nanotts_options(args)
+        self._speech = speech if speech is not None else start_speech(args)
         # rpi GPIO setup
-        self._on_pi = args.rpi
+        self._on_pi = args.rpi and not self._replay
         if self._on_pi:
             # noinspection PyPep8Naming
             import RPi.GPIO as gpio
@@ -57,18 +109,19 @@ class Ansprakon:
         self._min_buffer_length = args.buffer[0]
         self._min_result_count = args.buffer[1]
         self._grabbed_image = None
+        self._frame_seq = None
         self._preprocessed_image = None
         self._rois_cut = None
         self._rois_processed = None
         self._results_processed = None
-        self._result_buffer = []
+        self._result_buffer = result_buffer.ResultBuffer(30)
         self._last_spoken = None
 
         # setup systemd communication
         self._sdnotify = sdnotify.SystemdNotifier()
         self._sdnotify.notify("READY=1")
         if not self._mute:
-            call_nanotts.call_nanotts(self._nanotts_options)
+            self._speech.say("Ansprakon bereit.", nanotts_options=self._nanotts_options)
 
     @property
     def sdnotify(self):
@@ -76,71 +129,160 @@ class Ansprakon:
 
     def gpio_callback(self, channel):
         """
-Callback for the GPIO-Event detection thread, calls nanoTTS if results exist.
+Callback for the GPIO-Event detection thread, speaks the most common result at once if results exist.
         :param channel:
         """
+        if self._scheduler is not None:
+            self._scheduler.boost()
         if len(self._result_buffer) >= 2:
-            call_nanotts.call_nanotts(self._nanotts_options, max(set(self._result_buffer),
-                                                                 key=self._result_buffer.count))
+            self._speech.say(self._result_buffer.mode(), speech_queue.PRIORITY_BUTTON, key=self._speech_key + " button",
+                             interrupt=True, nanotts_options=self._nanotts_options)
 
     def get_frame(self):
         """
 Grabs an image from the cam thread, retries recursively on failing, to workaround cam issues.
+The frame is borrowed read-only from the cam thread, without a copy.
+        :return: True for a new frame, False if the newest frame was already processed
         """
         try:
-            self._grabbed_image = self._cam.read()
+            seq, frame = self._cam.read_seq()
         except cv2.error as e:
             print(e)
-            self.get_frame()
+            metrics.inc(metrics.CAMERA_RETRIES)
+            return self.get_frame()
+        if frame is None or seq == self._frame_seq:
+            return False
+        self._frame_seq = seq
+        self._grabbed_image = frame
+        return True
+
+    def wait_for_frame(self, timeout=1.0):
+        """
+Sleeps until the cam thread has a frame that was not processed yet.
+        :param timeout: seconds to wait at most
+        """
+        self._cam.wait(self._frame_seq, timeout)
+
+    def wait_for_schedule(self):
+        """
+Sleeps until the scheduler wants the next frame, returns at once without a scheduler.
+        """
+        if self._scheduler is not None:
+            self._scheduler.wait()
+
+    @property
+    def paced(self):
+        """
+        :return: True if a scheduler paces the frames
+        """
+        return self._scheduler is not None
 
-    # getattr() is used with the modules of the processing steps, this allows for modularization and avoids cluttering
-    # This way allows having all device in one branch, instead of branching for every device and it allows device
-    #  selection via flag
+    def frame_due(self):
+        """
+        :return: True if the scheduler wants the next frame, always True without a scheduler
+        """
+        return self._scheduler is None or self._scheduler.due()
+
+    @property
+    def cam(self):
+        return self._cam
+
+    def step(self, record=None, stages=None):
+        """
+Runs all processing steps on the grabbed frame.
+        :param record: optional function(stage, seconds) called with the duration of every step
+        :param stages: the steps to run, defaults to STAGES
+        :return: the processed result of the frame
+        """
+        for stage in stages or self.STAGES:
+            if record is None:
+                getattr(self, stage)()
+            else:
+                started = time.perf_counter()
+                getattr(self, stage)()
+                record(stage, time.perf_counter() - started)
+        if self._scheduler is not None:
+            self._scheduler.update(self._results_processed, self._rois_changed)
+        return self._results_processed
+
+    def take_rois(self, seq, preprocessed_image, rois_cut):
+        """
+Takes over the result of the vision stages run by another process, see staged_pipeline.py.
+        :param seq: number of the frame
+        :param preprocessed_image: the preprocessed image
+        :param rois_cut: the rois as list of lists [[ocr-rois], [feat-rois]]
+        """
+        self._frame_seq = seq
+        self._preprocessed_image = preprocessed_image
+        self._rois_cut = rois_cut
+        if self._scheduler is not None:
+            self._rois_changed = self._scheduler.rois_changed(self._rois_cut[0])
+
+    # The processing steps of the device are resolved once from its profile in device_profiles.json,
+    # see device_profile.py. This allows having all devices in one branch and device selection via flag.
 
     def preprocess_image(self):
         """
 Processes an Image with the methods defined for the device in image_preprocessor.py.
+Every --drift-interval frames the frame is checked for a moved cam first.
         """
-        self._preprocessed_image = getattr(image_preprocessor, "image_device_" + self._device_id)(self._grabbed_image)
+        if self._drift_monitor is not None:
+            drift_monitor.correct(self._drift_monitor, self._grabbed_image, self._calibration, self._pipeline)
+        self._preprocessed_image = self._pipeline.preprocess(self._grabbed_image)
 
     def cut_rois(self):
         """
 Cuts out Rois and perform additional processing as specified in roi_cutter.py.
 Stores rois in _rois_processed as list of lists [[ocr-rois], [feat-rois]].
         """
-        self._rois_cut = getattr(roi_cutter, "roi_device_" + self._device_id)(self._preprocessed_image)
+        self._rois_cut = self._pipeline.cut_rois(self._preprocessed_image)
+        if self._scheduler is not None:
+            self._rois_changed = self._scheduler.rois_changed(self._rois_cut[0])
 
     def run_ssocr(self):
         """
-Calls ssocr with the options matching the device, specified in ssocr.py and stores the result in _rois_processed[0].
+Calls ssocr with the options of the device profile and stores the result in _rois_processed[0].
         """
-        self._rois_processed = getattr(ssocr, "ssocr_device_" + self._device_id)(self._rois_cut)
+        self._rois_processed = self._pipeline.run_ssocr(self._rois_cut)
+        if self._voter is not None:
+            confidences = [seven_segment.confidence(roi, self._pipeline.ssocr_args) for roi in self._rois_cut[0]]
+            fused = self._voter.update(self._rois_processed[0], confidences)
+            self._vote_stable = fused is not None
+            if self._vote_stable:
+                self._rois_processed[0] = fused
         self._rois_cut[0] = self._rois_processed[0]
 
     def detect_feat(self):
         """
 Detect features of the device as specified in feat_detector.py, if the device has features.
         """
-        if len(self._rois_cut[1]) > 1:
-            self._rois_processed = getattr(feat_detector, "feat_detect_device_" + self._device_id)(self._rois_cut)
+        self._rois_processed = self._pipeline.detect_feat(self._rois_processed, self._preprocessed_image)
 
     def process_result(self):
         """
 Processes the results of ssocr.py and feat_detector.py as specified in result_processor.py.
         """
-        self._results_processed = getattr(result_processor,
-                                          "process_results_device_" + self._device_id)(self._rois_processed)
+        self._results_processed = self._pipeline.process_results(self._rois_processed)
         if self._results_processed is not None:
             self._result_buffer.append(self._results_processed)
-        # scrub result buffer if needed
-        if len(self._result_buffer) > 30:
-            self._result_buffer = self._result_buffer[-15:]
+        else:
+            metrics.inc(metrics.DROPPED_RESULTS)
 
         print(self._results_processed)
 
+    def _is_final(self):
+        """
+Checks if the newest result is the final result, by the temporal vote if enabled,
+else if it was read at least min. result count times in a buffer of min. bufferlength.
+        """
+        if self._voter is not None:
+            return self._vote_stable
+        return len(self._result_buffer) >= self._min_buffer_length \
+            and self._result_buffer.count(self._results_processed, skip_newest=True) >= self._min_result_count
+
     def speak_result(self):
         """
-Speaks the result with call_nanotts if speaking is not by button and the result was not spoken max 3 read before.
+Queues the result for the speech thread if speaking is not by button and the result was not spoken max 3 read before.
 Or if it is final result device, speake the result if it was read at least 5 times before.
         """
 
@@ -150,36 +292,72 @@ Or if it is final result device, speake the result if it was read at least 5 tim
 
         # for speak on change devices
         if not self._speak_on_button and not self._final_result and self._results_processed is not None:
-            if self._results_processed not in self._result_buffer[-3:-1] \
+            if not self._result_buffer.recent(self._results_processed, 2, skip_newest=True) \
                     and self._results_processed != self._last_spoken:
-                call_nanotts.call_nanotts(self._nanotts_options, self._results_processed)
+                self._speech.say(self._results_processed, key=self._speech_key,
+                                 nanotts_options=self._nanotts_options)
                 self._last_spoken = self._results_processed
                 self.sdnotify.notify("Spoke: " + self._results_processed)
 
         # for final result devices
         if self._final_result and not self._speak_on_button and self._results_processed is not None:
-            if len(self._result_buffer) >= self._min_buffer_length:
-                if self._result_buffer[0:-1].count(self._results_processed) >= self._min_result_count \
-                        and self._results_processed != self._last_spoken:
-                    call_nanotts.call_nanotts(self._nanotts_options, self._results_processed)
-                    self._last_spoken = self._results_processed
-                    self.sdnotify.notify("Spoke: " + self._results_processed)
+            if self._is_final() and self._results_processed != self._last_spoken:
+                self._speech.say(self._results_processed, key=self._speech_key,
+                                 nanotts_options=self._nanotts_options)
+                self._last_spoken = self._results_processed
+                self.sdnotify.notify("Spoke: " + self._results_processed)
 
         else:
             print("Did not Speak.")
 
 
-def main():
+def nanotts_options(args):
     """
-Setup argument parser and then run the processing loop.
+    :param args: parsed arguments of build_parser()
+    :return: the flags for nanoTTS
     """
-    license_info = """
-        AnSpraKon  Copyright (C) 2018  Matthias Axel Kröll
-        This program comes with ABSOLUTELY NO WARRANTY; 
-        This is free software, and you are welcome to redistribute it under certain conditions; 
-        """
-    print(license_info)
+    return ["-v", args.language,
+            "--speed", args.speed,
+            "--pitch", args.pitch,
+            "--volume", args.volume]
+
+
+def configure_ocr(args):
+    """
+Sets up the ocr backend, dispatch and cache of call_ssocr, they are shared by all pipelines of the process.
+    :param args: parsed arguments of build_parser()
+    """
+    call_ssocr.set_backend(args.ocr_backend, args.ocr_workers)
+    call_ssocr.set_dispatch(args.ocr_parallel, args.ocr_timeout, args.ocr_workers)
+    call_ssocr.set_cache(args.ocr_cache)
+
 
+def start_speech(args, device_ids=None):
+    """
+Starts the speech queue with the speech engine of args.
+    :param args: parsed arguments of build_parser()
+    :param device_ids: devices whose fixed texts are rendered by --warm-up, defaults to args.device
+    :return: the started SpeechQueue
+    """
+    options = nanotts_options(args)
+    speak = call_nanotts.start_nanotts
+    if args.speech_engine in ("cache", "concat"):
+        cache = speech_cache.SpeechCache(args.speech_cache_dir, int(args.speech_cache_size * 1024 * 1024))
+        engine = cache if args.speech_engine == "cache" else speech_concat.SpeechConcat(cache)
+        speak = engine.start
+        if args.warm_up:
+            # render the fixed texts of the devices in the background, the cam loop starts at once
+            phrases = ["Ansprakon bereit."]
+            for device_id in device_ids or [args.device]:
+                phrases += result_processor.PHRASES.get(device_id, [])
+            threading.Thread(target=engine.warm_up, args=(options, phrases), daemon=True).start()
+    return speech_queue.SpeechQueue(options, speak).start()
+
+
+def build_parser():
+    """
+    :return: the argparse.ArgumentParser of the command line, also used for the pipelines of supervisor.py
+    """
     parser = argparse.ArgumentParser(description="read 7-segment displays and read out the result")
     parser.add_argument("device", help="enter the ID of the device to use")
     parser.add_argument("-b", "--button", help="speak on button press", action="store_true")
@@ -196,24 +374,140 @@ Setup argument parser and then run the processing loop.
     parser.add_argument("-q", "--buffer",
                         help="min. bufferlength and min. result count to be the finalresult",
                         default=[8, 6], type=int, nargs="+")
+    parser.add_argument("--vote", help="decide the final result by a confidence weighted vote per character over the "
+                                       "last min. bufferlength frames once every character reaches this posterior, "
+                                       "e.g. 0.99, instead of the result counts",
+                        default=None, type=float)
+    parser.add_argument("--replay", help="process every frame of a recorded video as fast as possible instead of "
+                                         "the cam, without speech and GPIO, and report the timings",
+                        default=None, metavar="VIDEO")
+    parser.add_argument("--replay-report", help="write the replay report as json to this file",
+                        default=None, metavar="JSON")
+    parser.add_argument("--capture-mode", help="decode every cam frame, decode at --fps or decode on demand",
+                        default="continuous", choices=opencv_webcam_multithread.CAPTURE_MODES)
+    parser.add_argument("--fps", help="frame rate for the paced capture mode", default=None, type=float)
+    parser.add_argument("--staged", help="capture and preprocess in two more processes, connected by shared "
+                                         "memory queues, so up to three frames are processed at the same time",
+                        action="store_true")
+    parser.add_argument("--staged-depth", help="frames in flight between two stages, the oldest is dropped "
+                                               "when a stage lags", default=2, type=int)
+    parser.add_argument("--min-rate", help="frames per second while the display does not change, overrides the "
+                                           "device profile, best with --capture-mode on-demand, with --staged only "
+                                           "the ocr is paced", type=float)
+    parser.add_argument("--max-rate", help="frames per second while the display changes, overrides the device "
+                                           "profile", type=float)
+    parser.add_argument("--calibrate", help="locate the display before starting and correct the geometry of the "
+                                            "device by its shift, the first calibration sets the reference position",
+                        action="store_true")
+    parser.add_argument("--calibration-file", help="json file of the calibration, defaults to one per device and "
+                                                   "cam in $XDG_CONFIG_HOME/ansprakon (~/.config/ansprakon)")
+    parser.add_argument("--drift-interval", help="check every this many frames if the cam moved and correct the "
+                                                 "geometry, off if not set", type=int)
+    parser.add_argument("--drift-tolerance", help="shift in pixels above which the cam counts as moved",
+                        default=4.0, type=float)
+    parser.add_argument("--profiles", help="json file with the device profiles",
+                        default=device_profile.DEFAULT_PROFILES)
+    parser.add_argument("--change-sensitivity", help="skip the ocr of rois whose mean difference to their last "
+                                                     "ocr is below this value (0-255), off if not set",
+                        default=None, type=float)
+    parser.add_argument("--refresh-interval", help="seconds after which unchanged rois are recognized again",
+                        default=10.0, type=float)
+    parser.add_argument("--ocr-backend", help="ssocr subprocess per roi, in-process seven segment decoder or "
+                                              "pool of ssocr worker processes, only faster with several cores",
+                        default="ssocr", choices=call_ssocr.BACKENDS)
+    parser.add_argument("--ocr-workers", help="number of ssocr workers, defaults to the number of CPUs",
+                        default=None, type=int)
+    parser.add_argument("--ocr-parallel", help="recognize the rois of a frame concurrently", action="store_true")
+    parser.add_argument("--ocr-timeout", help="seconds after which a hanging roi is dropped",
+                        default=None, type=float)
+    parser.add_argument("--ocr-cache", help="number of ocr results cached per binarized roi, 0 disables the cache",
+                        default=0, type=int)
+    parser.add_argument("--speech-engine", help="synthesize every text with nanoTTS, play cached WAV files or splice "
+                                                "cached fragments of numbers and words",
+                        default="nanotts", choices=["nanotts", "cache", "concat"])
+    parser.add_argument("--speech-cache-dir", help="directory of the cached WAV files",
+                        default=speech_cache.DEFAULT_CACHE_DIR)
+    parser.add_argument("--speech-cache-size", help="size of the speech cache in MB", default=50, type=float)
+    parser.add_argument("--warm-up", help="render the fixed texts of the device, and for concat all fragments, "
+                                            "into the speech cache at start",
+                        action="store_true")
+
+    parser.add_argument("--metrics-port", help="serve timing histograms and failure counters in the Prometheus "
+                                               "format on this port of localhost", default=None, type=int)
+    parser.add_argument("--metrics-file", help="write the metrics to this file every --metrics-interval seconds",
+                        default=None)
+    parser.add_argument("--metrics-interval", help="seconds between writes of the metrics file",
+                        default=10.0, type=float)
 
     parser.add_argument("--version", action="version", version="%(AnSpraKon)s 2.0 ")
     parser.add_argument("--show-w", help="Show warranty details of the GPL", action="store_true")
     parser.add_argument("--show-c", help="Show redistribution conditions of the GPL", action="store_true")
+    return parser
 
-    args = parser.parse_args()
 
-    ansprakon = Ansprakon(args)
+def main():
+    """
+Setup argument parser and then run the processing loop.
+    """
+    license_info = """
+        AnSpraKon  Copyright (C) 2018  Matthias Axel Kröll
+        This program comes with ABSOLUTELY NO WARRANTY; 
+        This is free software, and you are welcome to redistribute it under certain conditions; 
+        """
+    print(license_info)
+
+    args = build_parser().parse_args()
+
+    if args.calibrate:
+        try:
+            calibration.calibrate(args)
+        except ValueError as e:
+            print("Calibration failed: {}".format(e))
+
+    # the processes of the stages are forked before the ocr workers and the speech thread of this process
+    staged = staged_pipeline.StagedPipeline(args, args.staged_depth).start() if args.staged else None
+    configure_ocr(args)
+    ansprakon = Ansprakon(args, cam=staged)
+
+    if args.replay is not None and staged is None:
+        report = replay.run(ansprakon, ansprakon.cam)
+        ansprakon.cam.stop()
+        replay.print_report(report)
+        if args.replay_report is not None:
+            replay.write_report(report, args.replay_report)
+        return
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_file is not None:
+        metrics.write_periodically(args.metrics_file, args.metrics_interval)
+    # the stages are only timed with metrics enabled
+    record = metrics.observe if metrics.enabled() else None
+
+    if staged is not None:
+        started = time.perf_counter()
+        try:
+            frames = staged_pipeline.run(ansprakon, staged, record)
+        finally:
+            staged.stop()
+        seconds = time.perf_counter() - started
+        print("{} frames in {:.2f} s, {:.1f} fps".format(frames, seconds, frames / seconds if seconds else 0.0))
+        return
 
     while True:
         # try:
-        ansprakon.get_frame()
-        ansprakon.preprocess_image()
-        ansprakon.cut_rois()
-        ansprakon.run_ssocr()
-        ansprakon.detect_feat()
-        ansprakon.process_result()
-        ansprakon.speak_result()
+        ansprakon.wait_for_schedule()
+        if record is not None:
+            started = time.perf_counter()
+            grabbed = ansprakon.get_frame()
+            record("get_frame", time.perf_counter() - started)
+        else:
+            grabbed = ansprakon.get_frame()
+        if not grabbed:
+            # the newest frame was already processed, wait for the cam
+            ansprakon.wait_for_frame()
+            continue
+        ansprakon.step(record)
         ansprakon.sdnotify.notify("WATCHDOG=1")
         # except:
         #     print("Unexpected error:", sys.exc_info()[0])
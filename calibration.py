@@ -0,0 +1,183 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import os
+
+import cv2
+import numpy as np
+
+import preprocess_tools
+
+DEFAULT_CALIBRATION_DIR = os.path.join(os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
+                                       "ansprakon")
+# frames skipped before the calibration frame, so the exposure of the cam has settled
+SETTLE_FRAMES = 10
+# share of the frame diagonal the display may move, more is taken for a failed localization
+MAX_SHIFT = 0.25
+
+# The crop boxes and warp points of a device in image_preprocessor.py are measured for the display at a
+# reference position. The first calibration stores the display corners found at that position, every later one
+# the corners found now. The homography between both is folded into the remap tables of device_geometry.py,
+# so a bumped holder costs nothing per frame. The devices without a remap move their crop boxes by its shift.
+
+
+def default_path(device_id, cam=0):
+    return os.path.join(DEFAULT_CALIBRATION_DIR, "calibration_{}_cam{}.json".format(device_id, cam))
+
+
+def order_corners(pts):
+    """
+    :param pts: four points in any order
+    :return: float32 array of the points in the order [tl, tr, br, bl]
+    """
+    pts = np.asarray(pts, dtype=np.float32).reshape(4, 2)
+    sums = pts.sum(axis=1)
+    diffs = pts[:, 1] - pts[:, 0]
+    return np.float32([pts[np.argmin(sums)], pts[np.argmin(diffs)], pts[np.argmax(sums)], pts[np.argmax(diffs)]])
+
+
+def locate_display(frame, min_area=0.05):
+    """
+Finds the display as the largest convex outline in the frame.
+    :param frame: a frame of the cam
+    :param min_area: share of the frame the display covers at least
+    :return: float32 array of the corners [tl, tr, br, bl], None if there is no display
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    # automatic Canny edge detection around the median
+    sigma = 0.33
+    v = np.median(blurred)
+    edged = cv2.Canny(blurred, int(max(0, (1.0 - sigma) * v)), int(min(255, (1.0 + sigma) * v)))
+    # close small gaps of the outline
+    edged = cv2.dilate(edged, np.ones((3, 3), np.uint8))
+    contours = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+    frame_area = gray.shape[0] * gray.shape[1]
+    best = None
+    best_area = min_area * frame_area
+    for contour in contours:
+        hull = cv2.convexHull(contour)
+        area = cv2.contourArea(hull)
+        # the outline of the whole frame is not the display
+        if best_area <= area < 0.95 * frame_area:
+            best, best_area = hull, area
+    if best is None:
+        return None
+
+    approx = cv2.approxPolyDP(best, 0.02 * cv2.arcLength(best, True), True)
+    if len(approx) == 4:
+        return order_corners(approx)
+    # not a clean quadrilateral, take the box of the extreme points
+    ext_left, ext_right, ext_top, ext_bot = preprocess_tools.ext_from_hull(best)
+    return np.float32([[ext_left[0], ext_top[1]], [ext_right[0], ext_top[1]],
+                       [ext_right[0], ext_bot[1]], [ext_left[0], ext_bot[1]]])
+
+
+class Calibration:
+    """
+The display corners of a device at the reference position and now, stored as json.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the json file, it does not have to exist yet
+        """
+        self.path = path
+        self.shape = None
+        self.reference = None
+        self.corners = None
+        if os.path.exists(path):
+            with open(path) as calibration_file:
+                data = json.load(calibration_file)
+            self.shape = tuple(data["shape"])
+            self.reference = np.float32(data["reference"])
+            self.corners = np.float32(data["corners"])
+
+    def correction(self, shape=None):
+        """
+        :param shape: shape of the frames, None to skip the check
+        :return: the 3x3 homography from the reference position to the display now,
+        None if there is no calibration, it is for other frames or the display did not move
+        """
+        if self.reference is None or (shape is not None and tuple(shape[:2]) != self.shape[:2]):
+            return None
+        if np.array_equal(self.reference, self.corners):
+            return None
+        return cv2.getPerspectiveTransform(self.reference, self.corners)
+
+    def calibrate(self, frame):
+        """
+Locates the display in the frame and stores its corners, the first calibration sets the reference position.
+        :param frame: a frame of the cam
+        :return: the corners of the display
+        """
+        corners = locate_display(frame)
+        if corners is None:
+            raise ValueError("No display found")
+        if self.reference is None or self.shape != frame.shape[:2]:
+            self.reference = corners
+            self.shape = frame.shape[:2]
+        shift = np.max(np.linalg.norm(corners - self.reference, axis=1))
+        if shift > MAX_SHIFT * np.hypot(*frame.shape[:2]):
+            raise ValueError("The display moved by {:.0f} px, delete {} to set a new reference".format(shift,
+                                                                                                       self.path))
+        self.corners = corners
+        self.save()
+        # the located display, to check the calibration
+        cv2.imwrite(os.path.splitext(self.path)[0] + ".png",
+                    preprocess_tools.four_point_transform(frame, *corners))
+        return corners
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as calibration_file:
+            json.dump({"shape": list(self.shape), "reference": self.reference.tolist(),
+                       "corners": self.corners.tolist()}, calibration_file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def path_for(args):
+    """
+    :param args: parsed arguments of ansprakon.build_parser()
+    :return: the calibration file of the device and cam
+    """
+    return args.calibration_file or default_path(args.device, args.cam)
+
+
+def calibrate(args):
+    """
+Calibrates from a frame of the cam or the replayed video, for --calibrate.
+    :param args: parsed arguments of ansprakon.build_parser()
+    :return: the Calibration
+    """
+    stream = cv2.VideoCapture(args.replay if args.replay is not None else args.cam)
+    frame = None
+    for _ in range(1 if args.replay is not None else SETTLE_FRAMES):
+        (grabbed, next_frame) = stream.read()
+        if grabbed:
+            frame = next_frame
+    stream.release()
+    if frame is None:
+        raise ValueError("Can't read a frame to calibrate")
+    calibration = Calibration(path_for(args))
+    corners = calibration.calibrate(frame)
+    print("Display found at {}, saved to {}".format(corners.astype(int).tolist(), calibration.path))
+    return calibration
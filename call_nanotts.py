@@ -17,20 +17,29 @@
 import subprocess
 
 
+def start_nanotts(nanotts_options, text="Ansprakon bereit."):
+    """
+Starts nanoTTS in an subprocess without waiting for it, so the speech can be cancelled with terminate().
+    :param nanotts_options: see call_nanotts
+    :param text: this is the String to speak
+    :return: the subprocess.Popen of nanoTTS, None if it could not be started
+    """
+    nanotts_flags = ["nanotts-git"] + nanotts_options + ['"' + text + '"']
+    try:
+        return subprocess.Popen(nanotts_flags, stdout=subprocess.DEVNULL)
+    except OSError as e:
+        print("Error while speaking: {}".format(e))
+        return None
+
+
 def call_nanotts(nanotts_options, text="Ansprakon bereit."):
     """
-Calls nanoTTS in an subprocess. nanoTTS parses text to pico.
+Calls nanoTTS in an subprocess and waits until the text is spoken. nanoTTS parses text to pico.
 -v de-DE flag sets the language to german.
 Volume & Speed & Pitch control with flags is possible, see man nanoTTS
     :param nanotts_options:
     :param text: this is the String to speak
     """
-    nanotts_flags = ["nanotts-git"] + nanotts_options + ['"' + text + '"']
-    # print(nanotts_flags)
-    # print(nanotts_options)
-    try:
-        subprocess.call(nanotts_flags, stdout=subprocess.PIPE)
-    except subprocess.CalledProcessError as e:
-        nanotts_error = "Error code {} while speaking, output: {}".format(e.returncode, e.output)
-        print(nanotts_error)
-        pass
+    process = start_nanotts(nanotts_options, text)
+    if process is not None and process.wait() != 0:
+        print("Error code {} while speaking.".format(process.returncode))
@@ -13,34 +13,142 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import concurrent.futures
 import cv2
+import metrics
+import multiprocessing
+import ocr_cache
+import seven_segment
+import ssocr_pool
 import subprocess
 
+# "ssocr" forks the ssocr binary for every roi, "native" decodes in-process with seven_segment.py,
+# "pool" sends the rois to long-lived worker processes, see ssocr_pool.py
+BACKENDS = ["ssocr", "native", "pool"]
+_backend = "ssocr"
+_pool = None
+_executor = None
+_timeout = None
+_cache = None
+
+
+def set_backend(backend, workers=None):
+    """
+Selects how the rois are recognized, see BACKENDS.
+    :param backend: name of the backend
+    :param workers: number of worker processes for the "pool" backend, defaults to the number of CPUs
+    """
+    global _backend, _pool
+    if backend not in BACKENDS:
+        raise ValueError("Unknown ssocr backend {}, use one of {}".format(backend, BACKENDS))
+    if backend == "pool" and _pool is None:
+        _pool = ssocr_pool.SsocrWorkerPool(workers)
+    _backend = backend
+
+
+def set_dispatch(parallel=False, timeout=None, workers=None):
+    """
+Configures how multicall_ssocr dispatches the rois of a frame.
+    :param parallel: recognize the rois concurrently in a thread pool instead of one after another
+    :param timeout: seconds after which a single roi is given up and read as "", None waits forever
+    :param workers: size of the thread pool, defaults to the number of CPUs
+    """
+    global _executor, _timeout
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+    if parallel:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers or multiprocessing.cpu_count())
+    _timeout = timeout
+    if _pool is not None:
+        _pool.timeout = timeout
+
+
+def set_cache(maxsize):
+    """
+Puts a LRU cache of ocr results in front of ssocr, see ocr_cache.py.
+    :param maxsize: number of cached results, 0 disables the cache
+    """
+    global _cache
+    _cache = ocr_cache.OcrCache(maxsize) if maxsize else None
+
 
 # Execute ssocr , encode cv2-MAT to .png and pipe it to STDIN, then receive the result from STDOUT.
-def call_ssocr(ssocr_args, img):
+# Returns None if the roi timed out or ssocr could not be run, so the result is not cached.
+def _call_ssocr(ssocr_args, img):
+    if _backend == "native":
+        return seven_segment.recognize(img, ssocr_args) if img is not None else ""
+    if _backend == "pool":
+        return _pool.map(ssocr_args, [img])[0]
+
+    if img is None:
+        return ""
+    # a new list per call, the arguments of the device are shared by all rois and threads.
+    # "ssocr" is the program, "-" makes ssocr expect the image from STDIN
+    argv = ["ssocr"] + [arg for arg in ssocr_args if arg not in ("ssocr", "-")] + ["-"]
+    img_as_png = cv2.imencode(".png", img)[1].tobytes()  # encode image as .png and convert to byte-string.
     try:
-        return_val = ""
-        # add "ssocr" as the first argument of the list.
-        ssocr_args.insert(0, "ssocr") if ssocr_args[0] != "ssocr" else ssocr_args[0]
-        # append "-" as last argument of the list, it makes ssocr expect the image from STDIN
-        ssocr_args.append("-") if ssocr_args[-1] != "-" else ssocr_args[-1]
-
-        if img is not None:
-            img_as_png = cv2.imencode(".png", img)[1].tostring()  # encode image as .png and convert to byte-string.
-            p = subprocess.Popen(ssocr_args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            out, err = p.communicate(img_as_png)  # send img as .png to ssocr and receive result in "out".
-            # print(err) # print stderr for debugging
-            # print(ssocr_args)
-            return_val = out.decode("utf-8")
-        return return_val
-    except subprocess.CalledProcessError as e:
-        print("Error code {} during ssocr call, output: {}".format(e.returncode, e.output))
+        p = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        print("Can't run ssocr: {}".format(e))
+        return None
+    try:
+        out, err = p.communicate(img_as_png, timeout=_timeout)  # send img as .png, receive result in "out".
+    except subprocess.TimeoutExpired:
+        p.kill()
+        p.communicate()
+        print("ssocr timed out after {} s.".format(_timeout))
+        return None
+    # print(err) # print stderr for debugging
+    # print(argv)
+    return out.decode("utf-8")
 
 
-def multicall_ssocr(rois, ssocr_args_list):
+def _multicall_ssocr(rois, ssocr_args_list):
+    if _backend == "pool":
+        # all rois at once, the workers recognize them in parallel
+        return _pool.map(ssocr_args_list, rois)
+
+    if _executor is not None and len(rois) > 1:
+        futures = [_executor.submit(_call_ssocr, ssocr_args_list, ocr_roi) for ocr_roi in rois]
+        concurrent.futures.wait(futures, timeout=_timeout)
+        ocr_results = []
+        for future in futures:
+            if future.done():
+                ocr_results.append(future.result())
+            else:
+                print("Dropping roi, ssocr timed out after {} s.".format(_timeout))
+                ocr_results.append(None)
+        return ocr_results
+
     ocr_results = []
     for ocr_roi in rois:
-        ocr_results.append(call_ssocr(ssocr_args_list, ocr_roi))
+        ocr_results.append(_call_ssocr(ssocr_args_list, ocr_roi))
+
+    return ocr_results
+
+
+def call_ssocr(ssocr_args, img):
+    return multicall_ssocr([img], ssocr_args)[0]
+
+
+def multicall_ssocr(rois, ssocr_args_list):
+    if _cache is None:
+        ocr_results = _multicall_ssocr(rois, ssocr_args_list)
+        metrics.inc(metrics.SSOCR_FAILURES, ocr_results.count(None))
+        return ["" if result is None else result for result in ocr_results]
+
+    # only the rois that are not in the cache are recognized
+    keys = [_cache.key(ssocr_args_list, ocr_roi) if ocr_roi is not None else None for ocr_roi in rois]
+    ocr_results = [_cache.get(key) if key is not None else "" for key in keys]
+    misses = [index for index, result in enumerate(ocr_results) if result is None]
+    if misses:
+        for index, result in zip(misses, _multicall_ssocr([rois[index] for index in misses], ssocr_args_list)):
+            if result is None:
+                metrics.inc(metrics.SSOCR_FAILURES)
+                result = ""
+            else:
+                _cache.put(keys[index], result)
+            ocr_results[index] = result
 
     return ocr_results
@@ -0,0 +1,101 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+
+def thumbnail(roi, size=(32, 16)):
+    """
+    :param roi: the thresholded roi
+    :param size: (width, height) of the thumbnail
+    :return: the roi shrunk to a thumbnail, as int16 so thumbnails can be subtracted
+    """
+    return cv2.resize(roi, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def difference(thumbnail_a, thumbnail_b):
+    """
+    :return: mean absolute difference (0-255) of two thumbnails of the same size
+    """
+    return np.mean(np.abs(thumbnail_a - thumbnail_b))
+
+
+class RoiChangeDetector:
+    """
+Skips the ocr of rois that did not change since they were last recognized and reuses the old result.
+Every roi is shrunk to a small thumbnail, a roi counts as changed if the mean absolute difference to the
+thumbnail of its last ocr is above the sensitivity.
+    """
+
+    def __init__(self, sensitivity=2.0, refresh_interval=10.0, thumbnail_size=(32, 16)):
+        """
+        :param sensitivity: mean absolute difference (0-255) of the thumbnails above which a roi has changed
+        :param refresh_interval: seconds after which a roi is recognized again even if it did not change
+        :param thumbnail_size: (width, height) of the thumbnails
+        """
+        self.sensitivity = sensitivity
+        self.refresh_interval = refresh_interval
+        self.thumbnail_size = thumbnail_size
+        self._thumbnails = {}
+        self._results = {}
+        self._recognized_at = {}
+
+    def changed(self, index, roi, now=None):
+        """
+Checks if a roi has to be recognized again.
+        :param index: position of the roi in the list of ocr rois
+        :param roi: the thresholded roi
+        :param now: current time.monotonic()
+        :return: True if the roi changed, is new or is due for a refresh
+        """
+        if roi is None or index not in self._results:
+            return True
+        now = time.monotonic() if now is None else now
+        if now - self._recognized_at[index] >= self.refresh_interval:
+            return True
+        shape, last_thumbnail = self._thumbnails[index]
+        if roi.shape != shape:
+            return True
+        return difference(thumbnail(roi, self.thumbnail_size), last_thumbnail) > self.sensitivity
+
+    def recognize(self, rois, ocr):
+        """
+Recognizes only the changed rois.
+        :param rois: list of ocr rois
+        :param ocr: function that takes a list of rois and returns the list of their ocr results
+        :return: list of ocr results, old results for the unchanged rois
+        """
+        now = time.monotonic()
+        changed = [index for index, roi in enumerate(rois) if self.changed(index, roi, now)]
+        results = [self._results.get(index, "") for index in range(len(rois))]
+
+        if changed:
+            for index, result in zip(changed, ocr([rois[index] for index in changed])):
+                results[index] = result
+                self._results[index] = result
+                self._recognized_at[index] = now
+                if rois[index] is not None:
+                    self._thumbnails[index] = (rois[index].shape, thumbnail(rois[index], self.thumbnail_size))
+                else:
+                    self._results.pop(index)
+
+        metrics.inc(metrics.ROIS_RECOGNIZED, len(changed))
+        metrics.inc(metrics.ROIS_UNCHANGED, len(rois) - len(changed))
+        return results
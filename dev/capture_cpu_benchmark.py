@@ -0,0 +1,141 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the CPU share of the capture thread in every capture mode, with a consumer that is slower than the cam.
+# The CPU time of the thread is read from its own clock, time.pthread_getcpuclockid, so the consumer does not count.
+# Run it on the target with the cam attached, the numbers depend on the cam and its codec. A video file given with
+# --simulate is replayed as a cam that delivers JPEG frames at the given rate: grab() only takes the next frame,
+# retrieve() decodes it, like a MJPEG cam does with V4L2.
+# usage: python dev/capture_cpu_benchmark.py [cam index or video] [seconds per mode] [consumer seconds per frame]
+#        [--simulate fps]
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import opencv_webcam_multithread  # noqa: E402
+
+
+class SimulatedCam:
+    """
+The frames of a video, encoded as JPEG and delivered at a fixed rate like a MJPEG cam.
+    """
+
+    def __init__(self, jpegs, fps):
+        self._jpegs = jpegs
+        self._interval = 1.0 / fps
+        self._next = time.monotonic()
+        self._index = -1
+
+    def grab(self):
+        # blocks until the cam delivers the next frame, like VIDIOC_DQBUF
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next + self._interval, time.monotonic())
+        self._index = (self._index + 1) % len(self._jpegs)
+        return True
+
+    def retrieve(self, image=None):
+        decoded = cv2.imdecode(self._jpegs[self._index], cv2.IMREAD_COLOR)
+        if image is not None and image.shape == decoded.shape:
+            np.copyto(image, decoded)
+            decoded = image
+        return True, decoded
+
+    def read(self, image=None):
+        self.grab()
+        return self.retrieve(image)
+
+    def release(self):
+        pass
+
+
+def encode_video(path):
+    stream = cv2.VideoCapture(path)
+    jpegs = []
+    while True:
+        (grabbed, frame) = stream.read()
+        if not grabbed:
+            break
+        jpegs.append(cv2.imencode(".jpg", frame)[1])
+    stream.release()
+    if not jpegs:
+        raise ValueError("Can't read frames from {}".format(path))
+    return jpegs
+
+
+def open_stream(src, mode, fps, simulated):
+    if simulated is None:
+        return opencv_webcam_multithread.WebcamVideoStream(src=src, mode=mode, fps=fps)
+    # the stream opens its source with cv2.VideoCapture, it gets the simulated cam instead
+    video_capture = cv2.VideoCapture
+    cv2.VideoCapture = lambda path: simulated
+    try:
+        return opencv_webcam_multithread.WebcamVideoStream(src=src, mode=mode, fps=fps)
+    finally:
+        cv2.VideoCapture = video_capture
+
+
+def measure(src, mode, seconds, consumer_delay, fps, simulated=None):
+    stream = open_stream(src, mode, fps, simulated).start()
+    clock = time.pthread_getcpuclockid(stream.thread.ident)
+    frames = 0
+    last_seq = None
+    cpu_start = time.clock_gettime(clock)
+    wall_start = time.monotonic()
+    while time.monotonic() - wall_start < seconds:
+        stream.wait(last_seq, timeout=1.0)
+        last_seq, frame = stream.read_seq()
+        if frame is not None:
+            frames += 1
+        # simulate the ocr of the main loop
+        time.sleep(consumer_delay)
+    cpu = time.clock_gettime(clock) - cpu_start
+    wall = time.monotonic() - wall_start
+    stream.stop()
+    stream.stream.release()
+    return cpu / wall, frames / wall
+
+
+def main():
+    args = sys.argv[1:]
+    simulate = None
+    if "--simulate" in args:
+        index = args.index("--simulate")
+        simulate = float(args[index + 1])
+        del args[index:index + 2]
+    src = args[0] if len(args) > 0 else "0"
+    src = int(src) if src.isdigit() else src
+    seconds = float(args[1]) if len(args) > 1 else 20.0
+    consumer_delay = float(args[2]) if len(args) > 2 else 0.2
+
+    print("mode          capture thread CPU  consumed fps")
+    baseline = None
+    jpegs = encode_video(src) if simulate is not None else None
+    for mode in opencv_webcam_multithread.CAPTURE_MODES:
+        simulated = SimulatedCam(jpegs, simulate) if simulate is not None else None
+        share, fps = measure(src, mode, seconds, consumer_delay, 1.0 / consumer_delay, simulated)
+        baseline = share if baseline is None else baseline
+        print("{:<12}  {:>18.1%}  {:>12.1f}  ({:+.0%} against continuous)".format(mode, share, fps,
+                                                                               share / baseline - 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the preprocessed images and ocr rois of every device with those of image_preprocessor.py and
+# roi_cutter.py of an older git revision, e.g. the one before a change of the geometry, on the frames of a video.
+# Prints per device and image the largest difference in grey levels and the most differing pixels of a frame.
+# Only the two files are taken from the revision, the modules they import (device_geometry.py, workspace.py, ...)
+# are the current ones.
+# usage: python dev/geometry_compare.py video [git revision, defaults to the first commit] [device ids...]
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import image_preprocessor  # noqa: E402
+import roi_cutter  # noqa: E402
+
+DEVICES = [str(device_id) for device_id in range(1, 14)]
+
+
+def load_revision(revision, name, directory):
+    source = subprocess.run(["git", "show", "{}:{}.py".format(revision, name)], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE).stdout
+    path = os.path.join(directory, "old_{}.py".format(name))
+    with open(path, "wb") as module_file:
+        module_file.write(source)
+    spec = importlib.util.spec_from_file_location("old_" + name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def images(preprocessor, cutter, device_id, frame):
+    # copies, the new images are reused by the next frame
+    preprocessed = getattr(preprocessor, "image_device_" + device_id)(frame)
+    planes = preprocessed if isinstance(preprocessed, list) else [preprocessed]
+    named = [("image {}".format(index), plane.copy()) for index, plane in enumerate(planes)]
+    rois = getattr(cutter, "roi_device_" + device_id)(preprocessed)[0]
+    return named + [("roi {}".format(index), roi.copy()) for index, roi in enumerate(rois) if roi is not None]
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python dev/geometry_compare.py video [git revision] [device ids...]")
+    revision = sys.argv[2] if len(sys.argv) > 2 else subprocess.run(
+        ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=ROOT, check=True,
+        stdout=subprocess.PIPE).stdout.decode().split()[0]
+    devices = sys.argv[3:] or DEVICES
+    # device 13 shows debug windows, not possible with a headless OpenCV
+    cv2.imshow = lambda *args: None
+    cv2.waitKey = lambda *args: -1
+
+    with tempfile.TemporaryDirectory() as directory:
+        old_preprocessor = load_revision(revision, "image_preprocessor", directory)
+        old_cutter = load_revision(revision, "roi_cutter", directory)
+
+    # device -> image name -> [largest difference, most differing pixels]
+    results = dict((device_id, {}) for device_id in devices)
+    stream = cv2.VideoCapture(sys.argv[1])
+    frames = 0
+    while True:
+        grabbed, frame = stream.read()
+        if not grabbed:
+            break
+        frames += 1
+        for device_id in devices:
+            old = images(old_preprocessor, old_cutter, device_id, frame)
+            new = images(image_preprocessor, roi_cutter, device_id, frame)
+            for (name, old_image), (_, new_image) in zip(old, new):
+                result = results[device_id].setdefault(name, [0, 0])
+                if old_image.shape != new_image.shape:
+                    result[:] = [-1, -1]
+                    continue
+                difference = cv2.absdiff(old_image, new_image)
+                result[0] = max(result[0], int(difference.max()))
+                result[1] = max(result[1], int(np.count_nonzero(difference)))
+    stream.release()
+
+    print("{} frames compared with {}, -1 for a different shape".format(frames, revision))
+    print("{:<8} {:<10} {:>10} {:>10}".format("device", "image", "max diff", "pixels"))
+    for device_id in devices:
+        for name, (largest, pixels) in results[device_id].items():
+            print("{:<8} {:<10} {:>10} {:>10}".format(device_id, name, largest, pixels))
+
+
+if __name__ == '__main__':
+    main()
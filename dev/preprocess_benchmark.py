@@ -0,0 +1,50 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the crop-first plans of image_preprocessor.py with the old rotate-the-whole-frame chains.
+# Prints the pixels read by rotation and gray conversion per frame and the time per frame.
+# usage: python dev/preprocess_benchmark.py [image]
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import image_preprocessor  # noqa: E402
+
+
+def main():
+    if len(sys.argv) > 1:
+        frame = cv2.imread(sys.argv[1])
+    else:
+        frame = np.random.randint(0, 256, (480, 640, 3), np.uint8)
+
+    runs = 200
+    print("device  pixels before  pixels after  ms before  ms after")
+    for device_id, plan in sorted(image_preprocessor.CROP_PLANS.items(), key=lambda item: int(item[0])):
+        assert np.array_equal(plan.apply(frame), plan.apply_naive(frame))
+        ms_before = timeit.timeit(lambda: plan.apply_naive(frame), number=runs) * 1000 / runs
+        ms_after = timeit.timeit(lambda: plan.apply(frame), number=runs) * 1000 / runs
+        print("{:>6}  {:>13}  {:>12}  {:>9.3f}  {:>8.3f}".format(device_id,
+                                                              plan.pixels(frame.shape, naive=True),
+                                                              plan.pixels(frame.shape),
+                                                              ms_before, ms_after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures with tracemalloc what image_preprocessor and roi_cutter allocate per frame in the steady state,
+# after some warm up frames. "blocks" and "bytes" are the allocations still alive when the stage returns,
+# "peak" is the highest amount of extra memory during the stage. Run it before and after a change to compare.
+# usage: python dev/roi_alloc_benchmark.py [video] [device ids...]
+import functools
+import os
+import sys
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import image_preprocessor  # noqa: E402
+import roi_cutter  # noqa: E402
+import workspace  # noqa: E402
+
+WARM_UP_FRAMES = 5
+MEASURED_FRAMES = 50
+
+
+def frames(video):
+    if video is None:
+        rng = np.random.default_rng(0)
+        while True:
+            yield cv2.resize((rng.random((61, 81, 3)) * 255).astype(np.uint8), (640, 480))
+    stream = cv2.VideoCapture(video)
+    while True:
+        grabbed, frame = stream.read()
+        if not grabbed:
+            # loop the video
+            stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        yield frame
+
+
+def _traced(function, inputs):
+    blocks = 0
+    size = 0
+    peak = 0
+    tracemalloc.start()
+    for item in inputs:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        output = function(item)
+        peak += tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+        for stat in after.compare_to(before, "filename"):
+            if stat.count_diff > 0:
+                blocks += stat.count_diff
+                size += stat.size_diff
+        del output
+    tracemalloc.stop()
+    return blocks / float(len(inputs)), size / float(len(inputs)), peak / float(len(inputs))
+
+
+def measure(device_id, source):
+    """
+    :return: dict of stage name -> (blocks, bytes, peak) per frame
+    """
+    # the workspaces of a pipeline, reused by every frame
+    preprocess = functools.partial(getattr(image_preprocessor, "image_device_" + device_id),
+                                   ws=workspace.Workspace())
+    cut_rois = functools.partial(getattr(roi_cutter, "roi_device_" + device_id), ws=workspace.Workspace())
+    frames_in = [next(source) for _ in range(WARM_UP_FRAMES + MEASURED_FRAMES)]
+    for frame in frames_in[:WARM_UP_FRAMES]:
+        cut_rois(preprocess(frame))
+    stages = {"preprocess": _traced(preprocess, frames_in[WARM_UP_FRAMES:])}
+
+    # the preprocessed images share the arrays of the device workspace, so the rois get copies of them
+    images = [copy_image(preprocess(frame)) for frame in frames_in[WARM_UP_FRAMES:]]
+    stages["cut_rois"] = _traced(cut_rois, images)
+    return stages
+
+
+def copy_image(img):
+    return [part.copy() for part in img] if isinstance(img, list) else img.copy()
+
+
+def main():
+    video = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].isdigit() else None
+    device_ids = [arg for arg in sys.argv[1:] if arg.isdigit()] or ["4", "5", "6", "8"]
+    source = frames(video)
+    print("device  stage       blocks/frame  bytes/frame  peak bytes/frame")
+    for device_id in device_ids:
+        for stage, (blocks, size, peak) in measure(device_id, source).items():
+            print("{:<6}  {:<10}  {:>12.1f}  {:>11.0f}  {:>16.0f}".format(device_id, stage, blocks, size, peak))
+
+
+if __name__ == '__main__':
+    main()
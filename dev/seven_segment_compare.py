@@ -0,0 +1,95 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the in-process seven segment decoder (--ocr-backend native) with the ssocr binary on the ocr rois of
+# recorded frames. Every frame of the video is preprocessed and cut like in ansprakon.py, then every ocr roi is
+# read by both backends. Prints the agreement per device and roi, and the differing reads; with a directory as
+# last argument the differing rois are written there as png, named device_frame_roi.png.
+# Run it on footage of every device before making the native decoder the default.
+# usage: python dev/seven_segment_compare.py video device_ids... [-o directory]
+import argparse
+import collections
+import os
+import shutil
+import sys
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import call_ssocr  # noqa: E402
+import device_profile  # noqa: E402
+import seven_segment  # noqa: E402
+
+# differing reads printed per device at most
+MAX_PRINTED = 20
+
+
+def compare(video, device_id, output_dir=None):
+    """
+    :return: dict of roi index to [agreeing reads, reads]
+    """
+    pipeline = device_profile.load(device_id)
+    stream = cv2.VideoCapture(video)
+    counts = collections.defaultdict(lambda: [0, 0])
+    printed = 0
+    frame_number = 0
+    while True:
+        grabbed, frame = stream.read()
+        if not grabbed:
+            break
+        frame_number += 1
+        ocr_rois = pipeline.cut_rois(pipeline.preprocess(frame))[0]
+        for index, roi in enumerate(ocr_rois):
+            if roi is None:
+                continue
+            expected = call_ssocr.call_ssocr(pipeline.ssocr_args, roi)
+            decoded = seven_segment.recognize(roi, pipeline.ssocr_args)
+            counts[index][1] += 1
+            if decoded == expected:
+                counts[index][0] += 1
+                continue
+            if printed < MAX_PRINTED:
+                print("device {} frame {} roi {}: ssocr {!r}, native {!r}".format(device_id, frame_number, index,
+                                                                                  expected, decoded))
+                printed += 1
+            if output_dir is not None:
+                cv2.imwrite(os.path.join(output_dir, "{}_{}_{}.png".format(device_id, frame_number, index)), roi)
+    stream.release()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the native seven segment decoder with ssocr")
+    parser.add_argument("video", help="recorded video of the display")
+    parser.add_argument("devices", nargs="+", help="device ids to cut the rois of")
+    parser.add_argument("-o", "--output", help="directory for the differing rois")
+    args = parser.parse_args()
+
+    if shutil.which("ssocr") is None:
+        sys.exit("ssocr is not installed, there is nothing to compare with")
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+    call_ssocr.set_backend("ssocr")
+
+    print("{:<8} {:>5} {:>8} {:>8} {:>8}".format("device", "roi", "reads", "agree", "share"))
+    for device_id in args.devices:
+        for index, (agree, reads) in sorted(compare(args.video, device_id, args.output).items()):
+            print("{:<8} {:>5} {:>8} {:>8} {:>7.1f}%".format(device_id, index, reads, agree,
+                                                             100.0 * agree / reads if reads else 0.0))
+
+
+if __name__ == '__main__':
+    main()
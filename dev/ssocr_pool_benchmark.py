@@ -0,0 +1,85 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the ocr latency per frame of the ssocr backends of call_ssocr.py on the ocr rois of a recorded video:
+# one ssocr process per roi one after another (the default), the same in a thread pool (--ocr-parallel)
+# and the worker pool (--ocr-backend pool). The rois are cut first, so only the ocr is timed.
+# The pool and the thread pool need a core per worker to gain anything, run it on the target hardware.
+# usage: python dev/ssocr_pool_benchmark.py video device_id [frames]
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import call_ssocr  # noqa: E402
+import device_profile  # noqa: E402
+
+# (label, backend, parallel)
+SETUPS = (("serial", "ssocr", False), ("parallel", "ssocr", True), ("pool", "pool", False))
+
+
+def cut_frames(video, device_id, count):
+    pipeline = device_profile.load(device_id)
+    stream = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        grabbed, frame = stream.read()
+        if not grabbed:
+            break
+        # copies, the rois are views into the reused workspace of the device
+        frames.append([None if roi is None else roi.copy()
+                       for roi in pipeline.cut_rois(pipeline.preprocess(frame))[0]])
+    stream.release()
+    return pipeline.ssocr_args, frames
+
+
+def measure(ssocr_args, frames):
+    milliseconds = []
+    for rois in frames:
+        started = time.perf_counter()
+        call_ssocr.multicall_ssocr(rois, ssocr_args)
+        milliseconds.append((time.perf_counter() - started) * 1000.0)
+    return np.array(milliseconds)
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("usage: python dev/ssocr_pool_benchmark.py video device_id [frames]")
+    if shutil.which("ssocr") is None:
+        sys.exit("ssocr is not installed")
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    ssocr_args, frames = cut_frames(sys.argv[1], sys.argv[2], count)
+    rois = sum(len(rois) for rois in frames)
+    print("{} frames with {} rois, {} CPUs".format(len(frames), rois, multiprocessing.cpu_count()))
+    print("{:<10} {:>9} {:>9} {:>9}".format("[ms/frame]", "mean", "p50", "p95"))
+    for label, backend, parallel in SETUPS:
+        call_ssocr.set_backend(backend)
+        call_ssocr.set_dispatch(parallel)
+        # the first frame starts the workers and threads
+        measure(ssocr_args, frames[:1])
+        milliseconds = measure(ssocr_args, frames)
+        print("{:<10} {:>9.2f} {:>9.2f} {:>9.2f}".format(label, milliseconds.mean(), np.percentile(milliseconds, 50),
+                                                         np.percentile(milliseconds, 95)))
+    call_ssocr.set_dispatch(False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the frames needed to decide a final result by the result counts of --buffer 8 6 and by --vote.
+# Without arguments it runs synthetic sequences of a display with misread segments at several error rates.
+# A recorded sequence has one frame per line with the rois separated by tabs, every roi is the ssocr output
+# optionally followed by a space and its confidence, e.g. "128 0.9<TAB>5 0.7".
+# usage: python dev/vote_benchmark.py [recorded sequence] [true result, the rois joined by spaces]
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import result_buffer  # noqa: E402
+import temporal_vote  # noqa: E402
+
+# characters a misread segment turns a digit into
+MISREADS = {"0": "86_", "1": "7_", "2": "8_", "3": "98_", "4": "9_", "5": "69_", "6": "85_", "7": "1_",
+            "8": "0693_", "9": "835_"}
+# thresholds of --vote to compare
+THRESHOLDS = (0.99, 0.999)
+
+
+def decide_by_counts(frames, min_buffer_length=8, min_result_count=6):
+    buffer = result_buffer.ResultBuffer(30)
+    for index, frame in enumerate(frames):
+        result = " ".join(text.rstrip() for text, _ in frame)
+        buffer.append(result)
+        if len(buffer) >= min_buffer_length and buffer.count(result, skip_newest=True) >= min_result_count:
+            return index + 1, result
+    return None, None
+
+
+def decide_by_vote(frames, threshold=0.99, window=8):
+    voter = temporal_vote.TemporalVoter(threshold, window)
+    for index, frame in enumerate(frames):
+        fused = voter.update([text for text, _ in frame], [confidence for _, confidence in frame])
+        if fused is not None:
+            return index + 1, " ".join(text.rstrip() for text in fused)
+    return None, None
+
+
+def synthetic_sequence(truth, error_rate, length, rng):
+    """
+Frames of a display showing truth, every character is misread with error_rate.
+Misread rois get a lower confidence than clean ones, like broken segments do.
+    """
+    frames = []
+    for _ in range(length):
+        frame = []
+        for text in truth.split(" "):
+            read = ""
+            misread = False
+            for char in text:
+                if rng.random() < error_rate:
+                    read += rng.choice(MISREADS[char])
+                    misread = True
+                else:
+                    read += char
+            confidence = rng.uniform(0.1, 0.6) if misread else rng.uniform(0.6, 1.0)
+            frame.append((read + "\n", confidence))
+        frames.append(frame)
+    return frames
+
+
+def read_sequence(path):
+    frames = []
+    with open(path) as sequence_file:
+        for line in sequence_file:
+            if not line.strip():
+                continue
+            frame = []
+            for field in line.rstrip("\n").split("\t"):
+                parts = field.split(" ")
+                frame.append((parts[0] + "\n", float(parts[1]) if len(parts) > 1 else 1.0))
+            frames.append(frame)
+    return frames
+
+
+def report(name, decisions, truth):
+    decided = [frames for frames, result in decisions if frames is not None]
+    wrong = sum(1 for frames, result in decisions if frames is not None and result != truth)
+    if decided:
+        decided.sort()
+        print("{:<10} decided {:>4}/{:<4} mean {:>5.1f} frames  p90 {:>3} frames  wrong {}".format(
+            name, len(decided), len(decisions), sum(decided) / float(len(decided)),
+            decided[int(0.9 * (len(decided) - 1))], wrong))
+    else:
+        print("{:<10} never decided".format(name))
+
+
+def main():
+    if len(sys.argv) > 2:
+        frames = read_sequence(sys.argv[1])
+        truth = sys.argv[2]
+        report("counts", [decide_by_counts(frames)], truth)
+        for threshold in THRESHOLDS:
+            report("vote {}".format(threshold), [decide_by_vote(frames, threshold)], truth)
+        return
+
+    rng = random.Random(1)
+    truth = "128 5"
+    for error_rate in (0.0, 0.05, 0.1, 0.2, 0.3):
+        sequences = [synthetic_sequence(truth, error_rate, 60, rng) for _ in range(500)]
+        print("character error rate {:.0%}".format(error_rate))
+        report("counts", [decide_by_counts(frames) for frames in sequences], truth)
+        for threshold in THRESHOLDS:
+            report("vote {}".format(threshold), [decide_by_vote(frames, threshold) for frames in sequences], truth)
+
+
+if __name__ == '__main__':
+    main()
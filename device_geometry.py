@@ -0,0 +1,188 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+
+import cv2
+import numpy as np
+
+import preprocess_plan
+
+# The geometry of every device is constant, so the homographies and the remap tables of calibrated devices are
+# computed once on the first frame and reused. The caches are keyed by the point sets, the output size and the
+# shape of the input image, the remap tables also by the correction. A drift correction or a recalibration
+# replaces the correction, so the remap tables (up to about 2 MB each) are kept for the MAX_MAPS last used corrected
+# geometries only, a table per pipeline of a supervisor is in use at a time.
+MAX_MAPS = 8
+_matrices = {}
+_maps = collections.OrderedDict()
+
+
+def _key_points(pts):
+    return tuple(tuple(float(c) for c in pt) for pt in pts)
+
+
+def perspective_matrix(src_pts, dst_size):
+    """
+Returns the homography that maps the four src_pts onto the corners of the output image, computed only once.
+    :param src_pts: the corners [tl, tr, bl, br] in the input image
+    :param dst_size: (width, height) of the output image
+    :return: the 3x3 perspective transform
+    """
+    key = (_key_points(src_pts), tuple(dst_size))
+    m = _matrices.get(key)
+    if m is None:
+        width, height = dst_size
+        pts1 = np.float32(src_pts)
+        pts2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
+        m = _matrices[key] = cv2.getPerspectiveTransform(pts1, pts2)
+    return m
+
+
+def warp(img, src_pts, dst_size, dst=None):
+    """
+warpPerspective with the cached homography.
+    :param img: image to warp
+    :param src_pts: the corners [tl, tr, bl, br] in img
+    :param dst_size: (width, height) of the output image
+    :param dst: array of the output size to write into, None to allocate it
+    :return: the warped image
+    """
+    return cv2.warpPerspective(img, perspective_matrix(src_pts, dst_size), tuple(dst_size), dst=dst)
+
+
+def _unrotate(x, y, rotate, src_width, src_height):
+    """
+Maps coordinates of a cv2.rotate()-ed image back to the coordinates of the source image.
+    """
+    if rotate is None:
+        return x, y
+    if rotate == cv2.ROTATE_180:
+        return src_width - 1 - x, src_height - 1 - y
+    if rotate == cv2.ROTATE_90_CLOCKWISE:
+        return y, src_height - 1 - x
+    if rotate == cv2.ROTATE_90_COUNTERCLOCKWISE:
+        return src_width - 1 - y, x
+    raise ValueError("Unknown rotation {}".format(rotate))
+
+
+def _build_map(src_shape, src_pts, dst_size, crop, rotate, correction):
+    """
+Computes the remap table for rotate -> crop -> warpPerspective -> correction in one step.
+The correction homography moves the source coordinates from the reference position of the display to where
+it is now, see calibration.py.
+    :return: the bounding box (y0, y1, x0, x1) of the used source pixels and the two float maps
+    """
+    src_height, src_width = src_shape[:2]
+    width, height = dst_size
+    crop_y, crop_x = (crop[0], crop[2]) if crop is not None else (0, 0)
+
+    u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+    if src_pts is not None:
+        m_inv = cv2.invert(perspective_matrix(src_pts, dst_size))[1]
+        w = m_inv[2, 0] * u + m_inv[2, 1] * v + m_inv[2, 2]
+        x = (m_inv[0, 0] * u + m_inv[0, 1] * v + m_inv[0, 2]) / w
+        y = (m_inv[1, 0] * u + m_inv[1, 1] * v + m_inv[1, 2]) / w
+    else:
+        x, y = u, v
+
+    x, y = _unrotate(x + crop_x, y + crop_y, rotate, src_width, src_height)
+    w = correction[2, 0] * x + correction[2, 1] * y + correction[2, 2]
+    x, y = ((correction[0, 0] * x + correction[0, 1] * y + correction[0, 2]) / w,
+            (correction[1, 0] * x + correction[1, 1] * y + correction[1, 2]) / w)
+
+    # only the bounding box of the used pixels has to be touched, one pixel more for the interpolation
+    x0 = int(max(0, np.floor(x.min()) - 1))
+    x1 = int(min(src_width, np.ceil(x.max()) + 2))
+    y0 = int(max(0, np.floor(y.min()) - 1))
+    y1 = int(min(src_height, np.ceil(y.max()) + 2))
+
+    # float maps, the fixed point maps of cv2.convertMaps round the positions differently than warpPerspective
+    return (y0, y1, x0, x1), (x - x0).astype(np.float32), (y - y0).astype(np.float32)
+
+
+def _prepare(src, gray, threshold, workspace):
+    # gray conversion and threshold of the used pixels only, both work per pixel
+    if gray and src.ndim == 3:
+        src = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY,
+                           dst=None if workspace is None else workspace.array("remap_gray", src.shape[:2]))
+    if threshold is not None:
+        thresh, maxval, threshold_type = threshold
+        src = cv2.threshold(src, thresh, maxval, threshold_type,
+                            dst=None if workspace is None else workspace.array("remap_thresh", src.shape))[1]
+    return src
+
+
+def remap(img, src_pts=None, dst_size=None, crop=None, rotate=None, gray=False, threshold=None, dst=None,
+          workspace=None, correction=None):
+    """
+Does cv2.rotate, cropping and warpPerspective with the cached homography, without rotating or converting more
+than the cropped window. The arguments describe the old chain: rotate the image, crop [y0:y1, x0:x1] from the
+rotated image, convert it to gray, threshold it and warp src_pts (coordinates in the crop) onto the whole output.
+The window is cut in source coordinates, then converted, thresholded and rotated, which only moves its pixels,
+and warped, so the result is the same as the one of the old chain.
+With a correction all steps are done by a single cv2.remap with a precomputed table instead.
+    :param img: the source image
+    :param src_pts: the corners [tl, tr, bl, br] in the cropped image, None for no warp
+    :param dst_size: (width, height) of the output, defaults to the size of the crop
+    :param crop: (y0, y1, x0, x1) in the rotated image, None for no crop
+    :param rotate: cv2.ROTATE_* code or None
+    :param gray: convert BGR to gray, only the used part of the image is converted
+    :param threshold: (thresh, maxval, type) of a cv2.threshold of the cropped window before the warp, None for none
+    :param dst: array of the output size to write into, e.g. from a workspace.Workspace
+    :param workspace: workspace.Workspace that holds the gray, thresholded and rotated window,
+    None to allocate them on every call
+    :param correction: 3x3 homography of the calibration of the cam, only for frames of the cam, None for none
+    :return: the transformed image
+    """
+    if dst_size is None:
+        if crop is not None:
+            dst_size = (crop[3] - crop[2], crop[1] - crop[0])
+        elif rotate in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE):
+            dst_size = img.shape[:2]
+        else:
+            dst_size = img.shape[1::-1]
+    dst_size = tuple(dst_size)
+
+    if correction is not None:
+        key = (img.shape[:2], None if src_pts is None else _key_points(src_pts), dst_size, crop, rotate,
+               correction.tobytes())
+        entry = _maps.get(key)
+        if entry is None:
+            entry = _maps[key] = _build_map(img.shape, src_pts, dst_size, crop, rotate, correction)
+            if len(_maps) > MAX_MAPS:
+                _maps.popitem(last=False)
+        else:
+            _maps.move_to_end(key)
+        (y0, y1, x0, x1), map1, map2 = entry
+        src = _prepare(img[y0:y1, x0:x1], gray, threshold, workspace)
+        return cv2.remap(src, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+    y0, y1, x0, x1 = preprocess_plan.source_box(crop, rotate, img.shape) if crop is not None \
+        else (0, img.shape[0], 0, img.shape[1])
+    window = _prepare(img[y0:y1, x0:x1], gray, threshold, workspace)
+    if rotate is not None:
+        shape = window.shape
+        if rotate in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE):
+            shape = (shape[1], shape[0]) + shape[2:]
+        window = cv2.rotate(window, rotate,
+                            dst=None if workspace is None else workspace.array("remap_rotated", shape, window.dtype))
+    if src_pts is None:
+        if dst is None:
+            return window.copy()
+        np.copyto(dst, window)
+        return dst
+    # a view of the window is warped like a copy, cv2 does not read outside of it
+    return cv2.warpPerspective(window, perspective_matrix(src_pts, dst_size), dst_size, dst=dst)
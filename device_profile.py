@@ -0,0 +1,147 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import os
+
+import call_ssocr
+import feat_detector
+import image_preprocessor
+import result_processor
+import roi_cutter
+import workspace
+
+DEFAULT_PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "device_profiles.json")
+
+# A profile in device_profiles.json looks like
+#   "ID": {
+#     "name": "human readable name of the device",
+#     "ssocr": [ssocr arguments],
+#     "feat_threshold": mean below which a feature roi counts as lit, leave out for devices without features,
+#     "features": [{"plane": index of the preprocessed image if there are several,
+#                   "crop": [y0, y1, x0, x1] the rects are relative to, "dilate": [kernel size, iterations] of the crop,
+#                   "threshold": overrides feat_threshold,
+#                   "rects": [[y0, y1, x0, x1] of every feature indicator]}, ...],
+#       all optional but "rects", see feat_detector.FeatureTable,
+#     "min_rate": frames per second while the display does not change, e.g. a scale between two measurements,
+#     "max_rate": frames per second while it changes, both optional and off in the shipped profiles,
+#       see frame_scheduler.AdaptiveScheduler,
+#     "preprocess": name of the function in image_preprocessor.py, defaults to "image_device_ID",
+#     "roi": name of the function in roi_cutter.py, defaults to "roi_device_ID",
+#     "result": name of the function in result_processor.py, defaults to "process_results_device_ID"
+#   }
+# The geometry of a device (crop boxes, rotation, warp points) stays in the functions of image_preprocessor.py
+# and roi_cutter.py.
+
+
+def load_profiles(path=DEFAULT_PROFILES):
+    """
+Reads all device profiles.
+    :param path: path of the json file
+    :return: dict of device id to profile
+    """
+    with open(path) as profiles_file:
+        return json.load(profiles_file)
+
+
+def _resolve(module, name):
+    function = getattr(module, name, None)
+    if function is None:
+        raise ValueError("{} has no function {}".format(module.__name__, name))
+    return function
+
+
+class DevicePipeline:
+    """
+All processing steps of one device, resolved once from its profile.
+    """
+
+    def __init__(self, device_id, profile):
+        self.device_id = device_id
+        self.name = profile.get("name", device_id)
+        self.ssocr_args = list(profile["ssocr"])
+        self.feat_threshold = profile.get("feat_threshold")
+        self.features = None
+        if "features" in profile:
+            self.features = feat_detector.FeatureTable(profile["features"], profile.get("feat_threshold", 240))
+        self.min_rate = profile.get("min_rate")
+        self.max_rate = profile.get("max_rate")
+        # optional change_detector.RoiChangeDetector, skips the ocr of unchanged rois
+        self.change_detector = None
+        # the arrays and the calibration belong to the pipeline, so two pipelines of the same device on
+        # different cams don't overwrite each other's images or calibration
+        self.workspace = workspace.Workspace()
+        self.roi_workspace = workspace.Workspace()
+        # homography of the calibration of the cam, None without one
+        self.correction = None
+
+        self._preprocess = _resolve(image_preprocessor, profile.get("preprocess", "image_device_" + device_id))
+        self._cut_rois = _resolve(roi_cutter, profile.get("roi", "roi_device_" + device_id))
+        self._process_results = _resolve(result_processor,
+                                         profile.get("result", "process_results_device_" + device_id))
+
+    def set_correction(self, correction):
+        """
+        :param correction: homography of the calibration of the cam, None to remove it, see calibration.py
+        """
+        self.correction = correction
+
+    def preprocess(self, img):
+        return self._preprocess(img, self.workspace, self.correction)
+
+    def cut_rois(self, img):
+        return self._cut_rois(img, self.roi_workspace)
+
+    def run_ssocr(self, rois):
+        """
+Calls ssocr on the ocr rois with the arguments of the device.
+        :param rois: [[ocr-rois], [feat-rois]]
+        :return: [[ocr-results], [feat-rois]]
+        """
+        if self.change_detector is not None:
+            return [self.change_detector.recognize(rois[0], self._multicall_ssocr), rois[1]]
+        return [self._multicall_ssocr(rois[0]), rois[1]]
+
+    def _multicall_ssocr(self, ocr_rois):
+        return call_ssocr.multicall_ssocr(ocr_rois, self.ssocr_args)
+
+    def detect_feat(self, rois, img):
+        """
+Detects the features of the device, from its feature table or from the feature rois.
+        :param rois: [[ocr-results], [feat-rois]]
+        :param img: the preprocessed image the features table is measured on
+        :return: [[ocr-results], [feat-results]], feat-results is a bool array for a feature table
+        """
+        if self.features is not None:
+            return [rois[0], self.features.detect(img)]
+        if self.feat_threshold is None:
+            return rois
+        return feat_detector.feat_detect_threshold(rois, self.feat_threshold)
+
+    def process_results(self, rois):
+        return self._process_results(rois)
+
+
+def load(device_id, path=DEFAULT_PROFILES):
+    """
+Builds the pipeline of a device from its profile.
+    :param device_id: ID of the device as given on the command line
+    :param path: path of the json file
+    :return: DevicePipeline
+    """
+    profiles = load_profiles(path)
+    if device_id not in profiles:
+        raise ValueError("No profile for device {} in {}".format(device_id, path))
+    return DevicePipeline(device_id, profiles[device_id])
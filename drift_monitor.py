@@ -0,0 +1,136 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import cv2
+import numpy as np
+
+import metrics
+
+
+class DriftMonitor:
+    """
+Detects a moved cam holder by phase correlation of a downsampled frame with the frame at the known position.
+The digits of the display change as well, so a shift is only taken if the reference moved by it explains part of
+the difference to the frame, and if two checks in a row find it. Only every interval-th frame is checked,
+a check takes about a millisecond.
+    """
+
+    def __init__(self, interval=30, tolerance=4.0, scale=0.25, min_response=0.1, explained=0.1):
+        """
+        :param interval: frames between two checks
+        :param tolerance: shift in pixels of the full frame above which the cam counts as moved
+        :param scale: factor the frame is downsampled by for the correlation
+        :param min_response: peak response (0-1) below which a shift is not trusted, e.g. with a hand in the frame
+        :param explained: share (0-1) of the difference to the reference the shift has to explain at least
+        """
+        self.interval = interval
+        self.tolerance = tolerance
+        self.scale = scale
+        self.min_response = min_response
+        self.explained = explained
+        self._reference = None
+        self._shape = None
+        self._window = None
+        self._frames = 0
+        # shift found by the last check, taken when the next check confirms it
+        self._candidate = None
+
+    def _small(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32)
+
+    def reset(self, frame):
+        """
+Takes the frame as the known position of the display.
+        :param frame: a frame of the cam
+        """
+        self._reference = self._small(frame)
+        self._shape = frame.shape[:2]
+        self._window = cv2.createHanningWindow(self._reference.shape[::-1], cv2.CV_32F)
+        self._frames = 0
+        self._candidate = None
+
+    def check(self, frame):
+        """
+        :param frame: the current frame of the cam
+        :return: the shift (dx, dy) in pixels of the full frame if the cam moved by more than the tolerance,
+        None if it did not or the frame was not checked
+        """
+        if self._shape != frame.shape[:2]:
+            self.reset(frame)
+            return None
+        self._frames += 1
+        if self._frames < self.interval:
+            return None
+        self._frames = 0
+        shift = self._shift(self._small(frame))
+        candidate, self._candidate = self._candidate, shift
+        if shift is None or candidate is None \
+                or np.hypot(shift[0] - candidate[0], shift[1] - candidate[1]) > self.tolerance:
+            return None
+        self._candidate = None
+        return shift
+
+    def _shift(self, small):
+        # shift in pixels of the full frame if it is above the tolerance and explains the frame, else None
+        (dx, dy), response = cv2.phaseCorrelate(self._reference, small, self._window)
+        if response < self.min_response or np.hypot(dx, dy) <= self.tolerance * self.scale:
+            return None
+        moved = cv2.warpAffine(self._reference, np.float32([[1, 0, dx], [0, 1, dy]]), small.shape[::-1],
+                               borderMode=cv2.BORDER_REPLICATE)
+        if self._difference(moved, small) > (1.0 - self.explained) * self._difference(self._reference, small):
+            return None
+        return dx / self.scale, dy / self.scale
+
+    def _difference(self, a, b):
+        # mean absolute difference, weighted like the correlation so the borders count less
+        return float(np.sum(cv2.absdiff(a, b) * self._window))
+
+
+def correct(monitor, frame, calibration, pipeline):
+    """
+Checks the frame for a moved cam and corrects the geometry of the device, by a new calibration if there is
+a reference position, else by translating the current correction. The devices that crop the frame directly
+only follow the translation part of the correction, see preprocess_plan.shift().
+    :param monitor: DriftMonitor
+    :param frame: the current frame of the cam
+    :param calibration: calibration.Calibration of the device and cam
+    :param pipeline: device_profile.DevicePipeline
+    :return: the shift (dx, dy) if the cam moved, else None
+    """
+    shift = monitor.check(frame)
+    if shift is None:
+        return None
+    metrics.inc(metrics.CAMERA_DRIFTS)
+    dx, dy = shift
+    recalibrated = False
+    if calibration.reference is not None:
+        try:
+            calibration.calibrate(frame)
+            correction = calibration.correction(frame.shape)
+            recalibrated = True
+        except ValueError as e:
+            print("Recalibration failed: {}".format(e))
+    if not recalibrated:
+        # the display moved by the shift, relative to the position of the current correction
+        translation = np.float64([[1, 0, dx], [0, 1, dy], [0, 0, 1]])
+        previous = pipeline.correction
+        correction = translation if previous is None else translation.dot(previous)
+    pipeline.set_correction(correction)
+    monitor.reset(frame)
+    print("The cam moved by ({:.1f}, {:.1f}) px, {} the geometry".format(dx, dy,
+                                                                        "recalibrated" if recalibrated else "shifted"))
+    return shift
@@ -14,152 +14,97 @@
 #     You should have received a copy of the GNU General Public License
 #     along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
 import cv2
+import numpy as np
 
 
-def feat_detect_device_0(feat_rois):
+def feat_detect_threshold(feat_rois, threshold=240):
     """
-    Dummy Device
-    :param feat_rois:
-    :return:
+Checks if the mean of every feature roi is not white, to determine if the feature is present.
+The threshold of a device is set in device_profiles.json.
+    :param feat_rois: [[ocr-results], [feat-rois]]
+    :param threshold: a feature is present if the mean of its roi is less or equal
+    :return: feat_rois with the feature rois replaced by True/False
     """
-    counter = 0
-    for _ in feat_rois[1]:
-        feat_rois[1][counter] = True
-        counter += 1
-    return feat_rois
-
-
-def feat_detect_device_1(feat_rois):
-    """
-BASETECH thermometer
-    :param feat_rois:
-    :return:
-    """
-    return feat_rois
-
-
-def feat_detect_device_2(feat_rois):
-    """
-ADE humanscale
-    :param feat_rois:
-    :return:
-    """
-    return feat_rois
-
-
-def feat_detect_device_3(feat_rois):
-    """
-beurer humanscale
-    :param feat_rois:
-    :return:
-    """
-    return feat_rois
-
-
-def feat_detect_device_4(feat_rois):
-    """
-NONAME indoor/outdoor thermometer
-    :param feat_rois:
-    :return:
-    """
-    # check if mean is not white to detemine if feature is present
-    for i in range(len(feat_rois[1])):
-        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= 240 else False
-
-    # print(feat_rois[1])
-    return feat_rois
-
-
-def feat_detect_device_5(feat_rois):
-    """
-GREEN alarm/radio
-    :param feat_rois:
-    :return:
-    """
-    return feat_rois
-
-
-def feat_detect_device_6(feat_rois):
-    """
-NONAME thermo-hygro
-    :param feat_rois:
-    :return:
-    """
-    # check if mean is not white to detemine if feature is present
-    for i in range(len(feat_rois[1])):
-        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= 240 else False
-
-    # print(feat_rois[1])
-    return feat_rois
-
-
-def feat_detect_device_7(feat_rois):
-    """
-GREEN alarm/radio
-    :param feat_rois:
-    :return:
-    """
-
-    return feat_rois
-
-
-def feat_detect_device_8(feat_rois):
-    """
-IDR alarm/radio
-    :param feat_rois:
-    :return:
-    """
-    for i in range(len(feat_rois[1])):
-        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= 240 else False
-
-    print(feat_rois[1])
-    return feat_rois
-
-
-def feat_detect_device_9(feat_rois):
-    """
-Schneider Microwave
-    :param feat_rois:
-    :return:
-    """
-
-    # check if mean is not white to detemine if feature is present
     for i in range(len(feat_rois[1])):
-        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= 240 else False
+        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= threshold else False
 
-    print(feat_rois[1])
     return feat_rois
 
 
-def feat_detect_device_11(feat_rois):
-    """
-SEVERIN Microwave
-    :param feat_rois:
-    :return:
-    """
-
-    # check if mean is not white to detemine if feature is present
-    for i in range(len(feat_rois[1])):
-        feat_rois[1][i] = True if cv2.mean(feat_rois[1][i])[0] <= 240 else False
-
-    print(feat_rois[1])
-    return feat_rois
-
-
-def feat_detect_device_12(feat_rois):
-    """
-Bloodpressure
-    :param feat_rois:
-    :return:
-    """
-    return feat_rois
-
-
-def feat_detect_device_7(feat_rois):
-    """
-BASETECH piggybank
-    :param feat_rois:
-    :return:
-    """
-
-    return feat_rois
+class FeatureTable:
+    """
+The feature indicators of a device as a table of rectangles, see "features" in device_profiles.json.
+The sums of all rects of a region are looked up in one integral image of the bounding box of the region,
+without cutting out and copying every indicator. Rects far apart belong in separate regions, so the
+integral images stay small.
+    """
+
+    def __init__(self, regions, threshold=240):
+        """
+        :param regions: list of dicts with "rects" [[y0, y1, x0, x1], ...] and optionally "plane" (index into a
+                        list of preprocessed images), "crop" [y0, y1, x0, x1] that the rects are relative to,
+                        "dilate" [kernel size, iterations] applied to the crop and "threshold"
+        :param threshold: a feature is present if the mean of its rect is less or equal
+        """
+        self._regions = []
+        areas = []
+        thresholds = []
+        for region in regions:
+            rects = np.array(region["rects"], dtype=np.intp).reshape(-1, 4)
+            y0, y1, x0, x1 = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+            # bounding box of the rects, the integral image is computed for it only
+            box = (y0.min(), y1.max(), x0.min(), x1.max())
+            y0, y1, x0, x1 = y0 - box[0], y1 - box[0], x0 - box[2], x1 - box[2]
+            # flat indices into the integral image of the corners of every rect,
+            # the sum of a rect is the first corner minus the second and third plus the fourth
+            width = box[3] - box[2] + 1
+            corners = np.stack([y1 * width + x1, y0 * width + x1, y1 * width + x0, y0 * width + x0])
+            dilate = region.get("dilate")
+            kernel = None
+            if dilate is not None:
+                kernel = (np.ones((dilate[0], dilate[0]), np.uint8), dilate[1])
+            self._regions.append((region.get("plane"), region.get("crop"), kernel, box, corners))
+            areas += list((y1 - y0) * (x1 - x0))
+            thresholds += [region.get("threshold", threshold)] * len(rects)
+        self._areas = np.array(areas, dtype=float)
+        self._thresholds = np.array(thresholds, dtype=float)
+        self.size = len(thresholds)
+
+    def sums(self, img):
+        """
+        :param img: the preprocessed image, or the list of images of a device with several planes
+        :return: int array of the pixel sums of all rects, in table order
+        """
+        sums = []
+        for plane, crop, kernel, box, corners in self._regions:
+            source = img[plane] if plane is not None else img
+            if source.ndim == 3:
+                # like cv2.mean()[0], only the first channel counts
+                source = source[:, :, 0]
+            if crop is not None:
+                source = source[crop[0]:crop[1], crop[2]:crop[3]]
+                if kernel is not None:
+                    # the rects were measured on the dilated crop, so the whole crop is dilated
+                    source = cv2.dilate(source, kernel[0], iterations=kernel[1])
+            if corners.shape[1] == 1:
+                # a single rect is its bounding box, it needs no integral image
+                sums.append(cv2.sumElems(source[box[0]:box[1], box[2]:box[3]])[:1])
+                continue
+            corner_sums = cv2.integral(source[box[0]:box[1], box[2]:box[3]]).take(corners)
+            sums.append(corner_sums[0] - corner_sums[1] - corner_sums[2] + corner_sums[3])
+        return np.concatenate(sums) if len(sums) > 1 else np.asarray(sums[0])
+
+    def means(self, img):
+        """
+        :param img: the preprocessed image, or the list of images of a device with several planes
+        :return: float array of the means of all rects, in table order
+        """
+        return self.sums(img) / self._areas
+
+    def detect(self, img):
+        """
+        :param img: the preprocessed image, or the list of images of a device with several planes
+        :return: bool array, True for every present feature, in table order
+        """
+        # sum <= threshold * area is mean <= threshold without the division
+        return self.sums(img) <= self._thresholds * self._areas
@@ -0,0 +1,114 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+import time
+
+import change_detector
+import result_buffer
+
+
+class AdaptiveScheduler:
+    """
+Paces the processing of frames by the activity of the display. While the rois or the result change,
+frames are processed at the max. rate; after settle_frames frames without a change the rate drops to the min. rate,
+e.g. a scale that shows the same weight until the next measurement. A change or a button press raises the rate again
+at once.
+    """
+
+    def __init__(self, min_rate=None, max_rate=None, settle_frames=10, sensitivity=2.0, thumbnail_size=(32, 16)):
+        """
+        :param min_rate: frames per second while the display does not change, None to stay at the max. rate
+        :param max_rate: frames per second while the display changes, None for every frame of the cam
+        :param settle_frames: frames without a change after which the rate drops
+        :param sensitivity: mean absolute difference (0-255) of the roi thumbnails above which a roi has changed
+        :param thumbnail_size: (width, height) of the roi thumbnails
+        """
+        if min_rate is not None and max_rate is not None and min_rate > max_rate:
+            raise ValueError("min. rate {} is above the max. rate {}".format(min_rate, max_rate))
+        self._fast = 1.0 / max_rate if max_rate else 0.0
+        self._slow = 1.0 / min_rate if min_rate else self._fast
+        self.settle_frames = settle_frames
+        self.sensitivity = sensitivity
+        self.thumbnail_size = thumbnail_size
+        self._thumbnails = None
+        self._last_result = None
+        self._idle_frames = 0
+        self._due = 0.0
+        self._boosted = threading.Event()
+
+    def rois_changed(self, rois):
+        """
+Compares the rois with those of the last processed frame.
+        :param rois: list of ocr rois
+        :return: True if a roi changed, or their number or shapes did
+        """
+        thumbnails = [None if roi is None else (roi.shape, change_detector.thumbnail(roi, self.thumbnail_size))
+                      for roi in rois]
+        last, self._thumbnails = self._thumbnails, thumbnails
+        if last is None or len(last) != len(thumbnails):
+            return True
+        for thumbnail, last_thumbnail in zip(thumbnails, last):
+            if thumbnail is None or last_thumbnail is None:
+                if thumbnail is not last_thumbnail:
+                    return True
+            elif thumbnail[0] != last_thumbnail[0] \
+                    or change_detector.difference(thumbnail[1], last_thumbnail[1]) > self.sensitivity:
+                return True
+        return False
+
+    def update(self, result, rois_changed=False, now=None):
+        """
+Schedules the next frame after a frame was processed.
+        :param result: the processed result of the frame
+        :param rois_changed: the rois changed, see rois_changed()
+        :param now: current time.monotonic()
+        """
+        now = time.monotonic() if now is None else now
+        result = result_buffer.hashable(result)
+        active = rois_changed or result != self._last_result
+        self._last_result = result
+        self._idle_frames = 0 if active else self._idle_frames + 1
+        self._due = now + self.interval()
+
+    def interval(self):
+        """
+        :return: seconds between the frames at the current activity
+        """
+        return self._slow if self._idle_frames >= self.settle_frames else self._fast
+
+    def due(self, now=None):
+        """
+        :param now: current time.monotonic()
+        :return: True if the next frame is due, for callers that can't sleep in wait()
+        """
+        return (time.monotonic() if now is None else now) >= self._due
+
+    def boost(self):
+        """
+Processes the next frame at once and returns to the max. rate, e.g. on a button press. Can be called from any thread.
+        """
+        self._idle_frames = 0
+        self._due = 0.0
+        self._boosted.set()
+
+    def wait(self):
+        """
+Sleeps until the next frame is due or boost() is called.
+        """
+        timeout = self._due - time.monotonic()
+        if timeout > 0:
+            self._boosted.wait(timeout)
+        self._boosted.clear()
@@ -14,14 +14,52 @@
 #     You should have received a copy of the GNU General Public License
 #     along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
 import cv2
+import device_geometry
 import numpy as np
-
+import preprocess_plan
+import workspace
 
 # import preprocess_tools
 
+# crop-first plans for the devices that rotated the whole frame before cropping, see preprocess_plan.py
+CROP_PLANS = {
+    "6": preprocess_plan.CropPlan((124, 447, 49, 495), cv2.ROTATE_180),
+    "7": preprocess_plan.CropPlan((41, 245, 13, 607), cv2.ROTATE_180),
+    "10": preprocess_plan.CropPlan((24, 175, 198, 425), cv2.ROTATE_180),
+}
+# the display windows of the devices that crop the frame directly, (y0, y1, x0, x1) in the frame
+DEVICE_1_BOX = (52, 314, 144, 534)
+DEVICE_8_BOX = (241, 401, 27, 622)
+
+# Every preprocessor is called as image_device_ID(img, ws, correction) with the state of its pipeline:
+# ws is the workspace.Workspace that owns the gray, threshold, mask, warp and border arrays of the pipeline.
+# The returned image is one of these arrays, so it is overwritten when the next frame is preprocessed.
+# Without a workspace the arrays are allocated on every call.
+# correction is the homography of the calibration of the cam, see calibration.py. It is applied by the remaps
+# of the whole frame. The devices that crop the frame directly move their crop box by its shift, those that cut
+# their rois from the whole frame move the gray frame back, see preprocess_plan.py.
+
+KERNEL_1X2 = np.ones((1, 2), np.uint8)
+KERNEL_3 = np.ones((3, 3), np.uint8)
+KERNEL_4 = np.ones((4, 4), np.uint8)
+KERNEL_5 = np.ones((5, 5), np.uint8)
+
+
+def _workspace(ws):
+    return workspace.Workspace() if ws is None else ws
+
+
+def _flood_fill(img, ws):
+    # the mask must be 2 pixels larger than the image and zero before every fill
+    h, w = img.shape[:2]
+    mask = ws.array("mask", (h + 2, w + 2))
+    mask.fill(0)
+    # Floodfill from point (0, 0)
+    cv2.floodFill(img, mask, (0, 0), 255)
+
 
 # Device ID 0
-def image_device_0(img):
+def image_device_0(img, ws=None, correction=None):
     """
 This is an example method of processor.
     :param img: the image to process
@@ -37,15 +75,17 @@ This is an example method of processor.
 
 
 # Device ID 1
-def image_device_1(img):
+def image_device_1(img, ws=None, correction=None):
     """
 The BASE-TECH Thermometer
     :param img: the image to preprocess
     :return: the preprocessed img
     """
-    # crop, rotate and convert to Greyscale
-    frame = cv2.rotate(img[52:314, 144:534], cv2.ROTATE_180)
-    gray = cv2.cvtColor(frame.copy(), cv2.COLOR_BGR2GRAY)
+    ws = _workspace(ws)
+    # crop, convert to Greyscale and rotate, so the rotation only moves one channel
+    y0, y1, x0, x1 = preprocess_plan.moved_box(DEVICE_1_BOX, correction, img.shape)
+    window = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY, dst=ws.array("window", (y1 - y0, x1 - x0)))
+    gray = cv2.rotate(window, cv2.ROTATE_180, dst=ws.array("gray", window.shape))
 
     # compute median
     # sigma = 0.33
@@ -86,38 +126,28 @@ The BASE-TECH Thermometer
     #                            cv2.THRESH_BINARY, 11, 2)
 
     # Copy the thresholded image.
-    ret, thresh1 = cv2.threshold(gray.copy(), 80, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
-    im_floodfill = thresh1.copy()
-
-    # Mask used to flood filling.
-    # Notice the size needs to be 2 pixels than the image.
-    h, w = thresh1.shape[:2]
-    mask = np.zeros((h + 2, w + 2), np.uint8)
+    ret, thresh1 = cv2.threshold(gray, 80, 255, cv2.ADAPTIVE_THRESH_MEAN_C, dst=ws.array("thresh", gray.shape))
 
-    # Floodfill from point (0, 0)
-    cv2.floodFill(im_floodfill, mask, (0, 0), 255)
+    # the floodfilled and warped image is not used for the ocr, only the dilated threshold image
+    # im_floodfill = thresh1.copy()
     #
-    # # Invert floodfilled image
-    # im_floodfill_inv = cv2.bitwise_not(im_floodfill)
+    # # Mask used to flood filling.
+    # # Notice the size needs to be 2 pixels than the image.
+    # h, w = thresh1.shape[:2]
+    # mask = np.zeros((h + 2, w + 2), np.uint8)
     #
-    # # Combine the two images to get the foreground.
-    # im_out = thresh1 | im_floodfill_inv
-
-    floodfilled_height, floodfilled_width = im_floodfill.shape
-    pts1 = np.float32([[14, 6], [350, 14], [10, 240], [350, 240]])
-    pts2 = np.float32(
-        [[0, 0], [floodfilled_width, 0], [0, floodfilled_height], [floodfilled_width, floodfilled_height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    dst = cv2.warpPerspective(im_floodfill, m, (floodfilled_width, floodfilled_height))
-
-    border_size = 10
-    bordered = cv2.copyMakeBorder(dst, top=border_size, bottom=border_size,
-                                  left=border_size,
-                                  right=border_size,
-                                  borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    # # Floodfill from point (0, 0)
+    # cv2.floodFill(im_floodfill, mask, (0, 0), 255)
+    #
+    # dst = device_geometry.warp(im_floodfill, [[14, 6], [350, 14], [10, 240], [350, 240]], im_floodfill.shape[::-1])
+    #
+    # border_size = 10
+    # bordered = cv2.copyMakeBorder(dst, top=border_size, bottom=border_size,
+    #                               left=border_size,
+    #                               right=border_size,
+    #                               borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
 
-    kernel_1 = np.ones((4, 4), np.uint8)
-    thresh1_dilated = cv2.dilate(thresh1, kernel_1, iterations=2)
+    thresh1_dilated = ws.dilate("dilated", thresh1, KERNEL_4, iterations=2)
 
     # # Display images
     # cv2.imshow("Thresholded Image", thresh1)
@@ -130,38 +160,24 @@ The BASE-TECH Thermometer
 
 
 # Device ID 2
-def image_device_2(img):
+def image_device_2(img, ws=None, correction=None):
     """
 ADE-Germany Human Scale
     :param img:
     """
-    frame = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    ret, thresh1 = cv2.threshold(frame, 180, 255, cv2.THRESH_BINARY_INV)
-    flip_180 = cv2.rotate(thresh1.copy(), cv2.ROTATE_180)
-    im_floodfill = flip_180.copy()
-
-    # Mask used to flood filling.
-    # Notice the size needs to be 2 pixels than the image.
-    h, w = thresh1.shape[:2]
-    mask = np.zeros((h + 2, w + 2), np.uint8)
-
-    # Floodfill from point (0, 0)
-    cv2.floodFill(im_floodfill, mask, (0, 0), 255)
-
-    floodfilled = im_floodfill[72:414, 83:439].copy()
-
-    floodfilled_height, floodfilled_width = floodfilled.shape
-    pts1 = np.float32([[28, 12], [339, 9], [25, 325], [348, 317]])
-    pts2 = np.float32(
-        [[0, 0], [floodfilled_width, 0], [0, floodfilled_height], [floodfilled_width, floodfilled_height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    preprocessed_image = cv2.warpPerspective(floodfilled, m, (floodfilled_width, floodfilled_height))
-
+    ws = _workspace(ws)
+    frame = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=ws.array("gray", img.shape[:2]))
+    frame = preprocess_plan.translate(frame, correction, dst=ws.array("translated", frame.shape))
+    ret, thresh1 = cv2.threshold(frame, 180, 255, cv2.THRESH_BINARY_INV, dst=ws.array("thresh", frame.shape))
+    # the rotated image is not needed afterwards, so it is floodfilled in place
+    im_floodfill = cv2.rotate(thresh1, cv2.ROTATE_180, dst=ws.array("rotated", thresh1.shape))
+    _flood_fill(im_floodfill, ws)
+
+    # crop [72:414, 83:439] and warp in one step, straight into the bordered image
     border_size = 10
-    bordered = cv2.copyMakeBorder(preprocessed_image, top=border_size, bottom=border_size,
-                                  left=border_size,
-                                  right=border_size,
-                                  borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    bordered, interior = ws.bordered("bordered", (414 - 72, 439 - 83), border_size)
+    device_geometry.remap(im_floodfill, [[28, 12], [339, 9], [25, 325], [348, 317]], crop=(72, 414, 83, 439),
+                          dst=interior)
 
     # cv2.imshow("uncropped", im_floodfill)
     # cv2.imshow("preprocessed", bordered)
@@ -171,58 +187,49 @@ ADE-Germany Human Scale
 
 
 # Device ID 3
-def image_device_3(img):
+def image_device_3(img, ws=None, correction=None):
     """
 BEURER Human Scale
     :param img:
     """
 
-    frame = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    flip_180 = cv2.rotate(frame.copy(), cv2.ROTATE_180)
-    ret, thresh1 = cv2.threshold(flip_180[162:449, 20:629], 80, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C)
+    ws = _workspace(ws)
+    # rotate, crop [162:449, 20:629], threshold and warp in one step, straight into the bordered image
+    border_size = 10
+    bordered, dst = ws.bordered("bordered", (449 - 162, 629 - 20), border_size)
+    device_geometry.remap(img, [[58, 24], [588, 33], [22, 264], [550, 273]],
+                          crop=(162, 449, 20, 629), rotate=cv2.ROTATE_180, gray=True,
+                          threshold=(80, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C), dst=dst, workspace=ws,
+                          correction=correction)
 
-    im_floodfill = thresh1.copy()
-    # cv2.imshow("flipped", thresh1)
+    # cv2.imshow("flipped", dst)
     # Mask used to flood filling.
     # Notice the size needs to be 2 pixels than the image.
-    h, w = thresh1.shape[:2]
-    mask = np.zeros((h + 2, w + 2), np.uint8)
+    # h, w = dst.shape[:2]
+    # mask = np.zeros((h + 2, w + 2), np.uint8)
 
     # Floodfill from point (0, 0)
-    # cv2.floodFill(im_floodfill, mask, (0, 0), 255)
-    # cv2.imshow("flood", im_floodfill)
-
-    floodfilled_height, floodfilled_width = im_floodfill.shape
-    pts1 = np.float32([[58, 24], [588, 33], [22, 264], [550, 273]])
-    pts2 = np.float32(
-        [[0, 0], [floodfilled_width, 0], [0, floodfilled_height], [floodfilled_width, floodfilled_height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    dst = cv2.warpPerspective(im_floodfill, m, (floodfilled_width, floodfilled_height))
-
-    border_size = 10
-    bordered = cv2.copyMakeBorder(dst, top=border_size, bottom=border_size,
-                                  left=border_size,
-                                  right=border_size,
-                                  borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    # cv2.floodFill(dst, mask, (0, 0), 255)
+    # cv2.imshow("flood", dst)
 
-    kernel = np.ones((4, 4), np.uint8)
-
-    bordered_dilated = cv2.dilate(bordered, kernel, iterations=1)
+    bordered_dilated = ws.dilate("dilated", bordered, KERNEL_4)
 
     # cv2.imshow("trans", bordered_dilated)
     # cv2.waitKey(1)
-    return bordered_dilated.copy()
+    return bordered_dilated
 
 
-def image_device_4(img):
+def image_device_4(img, ws=None, correction=None):
     """
 NONAME indoor/outdoor thermometer
     :param img:
     """
 
-    frame = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    ret, thresh1 = cv2.threshold(frame, 145, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
-    flip_180 = cv2.rotate(thresh1, cv2.ROTATE_180)
+    ws = _workspace(ws)
+    frame = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=ws.array("gray", img.shape[:2]))
+    frame = preprocess_plan.translate(frame, correction, dst=ws.array("translated", frame.shape))
+    ret, thresh1 = cv2.threshold(frame, 145, 255, cv2.ADAPTIVE_THRESH_MEAN_C, dst=ws.array("thresh", frame.shape))
+    flip_180 = cv2.rotate(thresh1, cv2.ROTATE_180, dst=ws.array("rotated", thresh1.shape))
     # im_floodfill = flip_180.copy()
 
     # # Mask used to flood filling.
@@ -239,50 +246,47 @@ NONAME indoor/outdoor thermometer
     return flip_180
 
 
-def image_device_5(img):
+def image_device_5(img, ws=None, correction=None):
     """
 GREEN radio alarm
     :param img:
     """
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    blur2 = cv2.medianBlur(blur, 5)
-    bi_filter = cv2.bilateralFilter(blur2, 11, 17, 17)
-    ret, thresh1 = cv2.threshold(bi_filter, 120, 255, cv2.THRESH_BINARY_INV)
-    blur3 = cv2.medianBlur(thresh1, 5)
+    ws = _workspace(ws)
+    shape = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=ws.array("gray", shape))
+    gray = preprocess_plan.translate(gray, correction, dst=ws.array("translated", shape))
+    blur = cv2.GaussianBlur(gray, (5, 5), 0, dst=ws.array("blur", shape))
+    blur2 = cv2.medianBlur(blur, 5, dst=ws.array("blur2", shape))
+    bi_filter = cv2.bilateralFilter(blur2, 11, 17, 17, dst=ws.array("bi_filter", shape))
+    ret, thresh1 = cv2.threshold(bi_filter, 120, 255, cv2.THRESH_BINARY_INV, dst=ws.array("thresh", shape))
+    blur3 = cv2.medianBlur(thresh1, 5, dst=ws.array("blur3", shape))
     # Display the resulting frame
     # cv2.imshow('frame', blur3)
     # cv2.waitKey(1)
 
-    return blur3.copy()
+    return blur3
 
 
 # Device ID 0
-def image_device_6(img):
+def image_device_6(img, ws=None, correction=None):
     """
 NONAME thermo-hygro
     :param img: the image to process
     :return: the proccesd img
     """
 
-    flip_180 = cv2.rotate(img.copy(), cv2.ROTATE_180)
-    gray = cv2.cvtColor(flip_180[124:447, 49:495].copy(), cv2.COLOR_BGR2GRAY)
+    ws = _workspace(ws)
+    # rotate 180, crop [124:447, 49:495] and convert to gray, crop first
+    gray = CROP_PLANS["6"].apply(img, ws, correction)
     # bi_filter = cv2.bilateralFilter(gray.copy(), 11, 17, 17)
-    ret, thresh1 = cv2.threshold(gray.copy(), 90, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
+    ret, thresh1 = cv2.threshold(gray, 90, 255, cv2.ADAPTIVE_THRESH_MEAN_C, dst=ws.array("thresh", gray.shape))
 
-    im_floodfill = thresh1.copy()
+    # the thresholded image is not needed afterwards, so it is floodfilled in place
+    im_floodfill = thresh1
+    _flood_fill(im_floodfill, ws)
 
-    # Mask used to flood filling.
-    # Notice the size needs to be 2 pixels than the image.
-    h, w = thresh1.shape[:2]
-    mask = np.zeros((h + 2, w + 2), np.uint8)
-
-    # Floodfill from point (0, 0)
-    cv2.floodFill(im_floodfill, mask, (0, 0), 255)
-
-    kernel = np.ones((1, 2), np.uint8)
-    closing = cv2.morphologyEx(im_floodfill, cv2.MORPH_ERODE, kernel)
-    closing2 = cv2.morphologyEx(closing, cv2.MORPH_CLOSE, kernel)
+    closing = cv2.morphologyEx(im_floodfill, cv2.MORPH_ERODE, KERNEL_1X2, dst=ws.array("closing", gray.shape))
+    closing2 = cv2.morphologyEx(closing, cv2.MORPH_CLOSE, KERNEL_1X2, dst=ws.array("closing2", gray.shape))
     # cv2.imshow("closing2",closing2)
     # cv2.waitKey(1)
 
@@ -290,37 +294,36 @@ NONAME thermo-hygro
 
 
 # Device ID 7
-def image_device_7(img):
+def image_device_7(img, ws=None, correction=None):
     """
 CASIO calculator MS-20UC
     :param img: the image to process
     :return: the processed img
     """
 
-    flip_180 = cv2.rotate(img, cv2.ROTATE_180)
-    gray = cv2.cvtColor(flip_180[41:245, 13:607], cv2.COLOR_BGR2GRAY)
+    # rotate 180, crop [41:245, 13:607] and convert to gray, crop first
+    gray = CROP_PLANS["7"].apply(img, _workspace(ws), correction)
 
-    return gray.copy()
+    return gray
 
 
 # Device ID 8
-def image_device_8(img):
+def image_device_8(img, ws=None, correction=None):
     """
 IDF radio-alarm
     :param img: the image to process
     :return: the processed img
     """
-    gray = cv2.cvtColor(img[241:401, 27:622].copy(), cv2.COLOR_BGR2GRAY)
+    ws = _workspace(ws)
+    y0, y1, x0, x1 = preprocess_plan.moved_box(DEVICE_8_BOX, correction, img.shape)
+    gray = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY, dst=ws.array("gray", (y1 - y0, x1 - x0)))
 
-    ret, thresh1 = cv2.threshold(gray, 115, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C)
-    height, width = thresh1.shape
-    pts1 = np.float32([[119, 20], [524, 20], [84, 150], [520, 150]])
-    pts2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    warped = cv2.warpPerspective(thresh1, m, (width, height))
+    # the unwarped threshold image is needed for the feature rois, so only the warp matrix is cached
+    ret, thresh1 = cv2.threshold(gray, 115, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, dst=ws.array("thresh", gray.shape))
+    warped = device_geometry.warp(thresh1, [[119, 20], [524, 20], [84, 150], [520, 150]], thresh1.shape[::-1],
+                                  dst=ws.array("warped", thresh1.shape))
 
-    kernel_1 = np.ones((3, 3), np.uint8)
-    dilated = cv2.dilate(warped, kernel_1, iterations=1)
+    dilated = ws.dilate("dilated", warped, KERNEL_3)
 
     processed = [thresh1, dilated]
 
@@ -328,40 +331,34 @@ IDF radio-alarm
 
 
 # Device ID 0
-def image_device_9(img):
+def image_device_9(img, ws=None, correction=None):
     """
 Schneider Mikrowelle
     :param img: the image to process
     :return: the processed img
     """
-    flipped = cv2.rotate(img, cv2.ROTATE_180)
-    gray = cv2.cvtColor(flipped.copy(), cv2.COLOR_BGR2GRAY)
-    ret, thresh1 = cv2.threshold(gray[109:287, 19:626].copy(), 80, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C)
-
-    # Mask used to flood filling.
-    # Notice the size needs to be 2 pixels than the image.
-    h, w = thresh1.shape[:2]
-    mask = np.zeros((h + 2, w + 2), np.uint8)
-
-    # Floodfill from point (0, 0)
-    im_floodfill = thresh1.copy()
-    cv2.floodFill(im_floodfill, mask, (0, 0), 255)
-
-    shape_height, shape_width = thresh1.shape
-    shape_pts1 = np.float32([[39, 14], [591, 15], [10, 173], [570, 171]])
-    shape_pts2 = np.float32([[0, 0], [shape_width, 0], [0, shape_height], [shape_width, shape_height]])
-    shape_m = cv2.getPerspectiveTransform(shape_pts1, shape_pts2)
-    shape_dst = cv2.warpPerspective(thresh1, shape_m, (shape_width, shape_height))
-
-    kernel = np.ones((5, 5), np.uint8)
-
-    shape_dilated = cv2.dilate(shape_dst, kernel, iterations=1)
+    ws = _workspace(ws)
+    # rotate, crop [109:287, 19:626], threshold and warp in one step
+    shape_dst = device_geometry.remap(img, [[39, 14], [591, 15], [10, 173], [570, 171]],
+                                      crop=(109, 287, 19, 626), rotate=cv2.ROTATE_180, gray=True,
+                                      threshold=(80, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C),
+                                      dst=ws.array("warped", (287 - 109, 626 - 19)), workspace=ws,
+                                      correction=correction)
+
+    # the floodfilled image was never used
+    # # Mask used to flood filling.
+    # # Notice the size needs to be 2 pixels than the image.
+    # h, w = shape_dst.shape[:2]
+    # mask = np.zeros((h + 2, w + 2), np.uint8)
+    #
+    # # Floodfill from point (0, 0)
+    # im_floodfill = shape_dst.copy()
+    # cv2.floodFill(im_floodfill, mask, (0, 0), 255)
 
+    # dilate into the white bordered image
     border_size = 10
-    white = [255, 255, 255]
-    shape_bordered = cv2.copyMakeBorder(shape_dilated, top=border_size, bottom=border_size, left=border_size,
-                                        right=border_size,
-                                        borderType=cv2.BORDER_CONSTANT, value=white)
+    shape_bordered, shape_dilated = ws.bordered("bordered", shape_dst.shape, border_size)
+    cv2.dilate(shape_dst, KERNEL_5, dst=shape_dilated)
 
     # cv2.imshow("1", shape_bordered)
     # cv2.waitKey(1)
@@ -370,15 +367,16 @@ Schneider Mikrowelle
 
 
 # Device ID 10
-def image_device_10(img):
+def image_device_10(img, ws=None, correction=None):
     """
 TECHNO-ONE Thermometer
     :param img: the image to process
     :return: the processed img
     """
-    flipped = cv2.rotate(img, cv2.ROTATE_180)
-    gray = cv2.cvtColor(flipped[24:175, 198:425].copy(), cv2.COLOR_BGR2GRAY)
-    ret, thresh1 = cv2.threshold(gray, 100, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
+    # rotate 180, crop [24:175, 198:425] and convert to gray, crop first
+    ws = _workspace(ws)
+    gray = CROP_PLANS["10"].apply(img, ws, correction)
+    ret, thresh1 = cv2.threshold(gray, 100, 255, cv2.ADAPTIVE_THRESH_MEAN_C, dst=ws.array("thresh", gray.shape))
 
     # kernel = np.ones((4, 4), np.uint8)
     # thresh1_dilated = cv2.dilate(thresh1, kernel, iterations=1)
@@ -391,70 +389,55 @@ TECHNO-ONE Thermometer
 
 
 # Device ID 11
-def image_device_11(img):
+def image_device_11(img, ws=None, correction=None):
     """
 SEVERIN Microwave
     :param img: the image to process
     :return: the processed img
     """
-    flipped = cv2.rotate(img, cv2.ROTATE_180)
-    gray = cv2.cvtColor(flipped[182:385, 0:639].copy(), cv2.COLOR_BGR2GRAY)
-
-    ret, thresh1 = cv2.threshold(gray, 127, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C)
-    height, width = thresh1.shape
-    pts1 = np.float32([[65, 13], [630, 15], [35, 169], [603, 186]])
-    pts2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    warped = cv2.warpPerspective(thresh1, m, (width, height))
+    ws = _workspace(ws)
+    # rotate, crop [182:385, 0:639], threshold and warp in one step
+    warped = device_geometry.remap(img, [[65, 13], [630, 15], [35, 169], [603, 186]],
+                                   crop=(182, 385, 0, 639), rotate=cv2.ROTATE_180, gray=True,
+                                   threshold=(127, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C),
+                                   dst=ws.array("warped", (385 - 182, 639)), workspace=ws,
+                                   correction=correction)
 
     return warped
 
 
 # Device ID 12
-def image_device_12(img):
+def image_device_12(img, ws=None, correction=None):
     """
 Bloodpressure
     :param img: the image to process
     :return: the processed img
     """
-    flipped = cv2.rotate(img.copy(), cv2.ROTATE_90_CLOCKWISE)
-    gray = cv2.cvtColor(flipped.copy(), cv2.COLOR_BGR2GRAY)
-
-    ret, thresh1 = cv2.threshold(gray[213:564, 59:389], 127, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
-
-    height, width = thresh1.shape
-    pts1 = np.float32([[18, 20], [303, 15], [25, 326], [307, 320]])
-    pts2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    warped = cv2.warpPerspective(thresh1, m, (width, height))
-
+    ws = _workspace(ws)
+    # rotate, crop [213:564, 59:389], threshold and warp in one step, straight into the white bordered image
     border_size = 10
-    bordered = cv2.copyMakeBorder(warped,
-                                  top=border_size,
-                                  bottom=border_size,
-                                  left=border_size,
-                                  right=border_size,
-                                  borderType=cv2.BORDER_CONSTANT,
-                                  value=[255, 255, 255])
+    bordered, warped = ws.bordered("bordered", (564 - 213, 389 - 59), border_size)
+    device_geometry.remap(img, [[18, 20], [303, 15], [25, 326], [307, 320]],
+                          crop=(213, 564, 59, 389), rotate=cv2.ROTATE_90_CLOCKWISE, gray=True,
+                          threshold=(127, 255, cv2.ADAPTIVE_THRESH_MEAN_C), dst=warped, workspace=ws,
+                          correction=correction)
 
     return bordered
 
 
 # Device ID 0
-def image_device_13(img):
+def image_device_13(img, ws=None, correction=None):
     """
 BASETECH piggybank
     :param img: the image to process
     :return: the processed img
     """
-    gray = cv2.cvtColor(img.copy(), cv2.COLOR_BGR2GRAY)
-
-    height, width = gray.shape
-    pts1 = np.float32([[258, 45], [618, 47], [237, 197], [606, 206]])
-    pts2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
-    m = cv2.getPerspectiveTransform(pts1, pts2)
-    warped = cv2.warpPerspective(gray, m, (width, height))
-    ret, thresh1 = cv2.threshold(warped, 55, 255, cv2.ADAPTIVE_THRESH_MEAN_C)
+    # convert to gray and warp the whole frame
+    ws = _workspace(ws)
+    warped = device_geometry.remap(img, [[258, 45], [618, 47], [237, 197], [606, 206]], gray=True,
+                                   dst=ws.array("warped", img.shape[:2]), workspace=ws,
+                                   correction=correction)
+    ret, thresh1 = cv2.threshold(warped, 55, 255, cv2.ADAPTIVE_THRESH_MEAN_C, dst=ws.array("thresh", warped.shape))
 
     cv2.imshow("warped", warped)
     cv2.imshow("thresh", thresh1)
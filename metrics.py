@@ -0,0 +1,173 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import bisect
+import http.server
+import os
+import threading
+import time
+
+# Timing histograms of the processing stages and counters of failures, in the Prometheus text format.
+# Everything is a no-op until enable() is called, the hot path only checks a flag.
+
+# upper bounds in seconds of the histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = "ansprakon_stage_seconds"
+DROPPED_RESULTS = "ansprakon_dropped_results_total"
+SSOCR_FAILURES = "ansprakon_ssocr_failures_total"
+CAMERA_RETRIES = "ansprakon_camera_retries_total"
+CAMERA_GRAB_FAILURES = "ansprakon_camera_grab_failures_total"
+DROPPED_FRAMES = "ansprakon_dropped_frames_total"
+CAMERA_DRIFTS = "ansprakon_camera_drifts_total"
+ROIS_RECOGNIZED = "ansprakon_rois_recognized_total"
+ROIS_UNCHANGED = "ansprakon_rois_unchanged_total"
+OCR_CACHE_HITS = "ansprakon_ocr_cache_hits_total"
+OCR_CACHE_MISSES = "ansprakon_ocr_cache_misses_total"
+OCR_CACHE_EVICTIONS = "ansprakon_ocr_cache_evictions_total"
+
+_HELP = {
+    STAGE_SECONDS: "Seconds spent in a processing stage.",
+    DROPPED_RESULTS: "Frames whose result was dropped by the result processor.",
+    SSOCR_FAILURES: "Rois whose ocr failed or timed out.",
+    CAMERA_RETRIES: "Frames read again after a cv2 error.",
+    CAMERA_GRAB_FAILURES: "Failed grabs of the cam thread.",
+    DROPPED_FRAMES: "Frames dropped by a full queue between the processes of the staged pipeline.",
+    CAMERA_DRIFTS: "Detected movements of the cam holder.",
+    ROIS_RECOGNIZED: "Rois sent to the ocr by the change detector.",
+    ROIS_UNCHANGED: "Rois whose last ocr result was reused by the change detector.",
+    OCR_CACHE_HITS: "Rois whose ocr result was found in the ocr cache.",
+    OCR_CACHE_MISSES: "Rois that were not in the ocr cache.",
+    OCR_CACHE_EVICTIONS: "Results evicted from the full ocr cache.",
+}
+
+_enabled = False
+_lock = threading.Lock()
+# stage -> [bucket counts..., count of +Inf], sum
+_stages = {}
+_counters = dict((name, 0) for name in (DROPPED_RESULTS, SSOCR_FAILURES, CAMERA_RETRIES, CAMERA_GRAB_FAILURES,
+                                        DROPPED_FRAMES, CAMERA_DRIFTS, ROIS_RECOGNIZED, ROIS_UNCHANGED,
+                                        OCR_CACHE_HITS, OCR_CACHE_MISSES, OCR_CACHE_EVICTIONS))
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+def observe(stage, seconds):
+    """
+Adds the duration of a stage to its histogram.
+    :param stage: name of the stage, e.g. "run_ssocr"
+    :param seconds: duration of the stage
+    """
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+
+
+def inc(name, amount=1):
+    """
+Increases a counter.
+    :param name: one of the counter names of this module
+    :param amount: added to the counter
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += amount
+
+
+def render():
+    """
+    :return: all metrics in the Prometheus text format
+    """
+    lines = ["# HELP {} {}".format(STAGE_SECONDS, _HELP[STAGE_SECONDS]),
+             "# TYPE {} histogram".format(STAGE_SECONDS)]
+    with _lock:
+        for stage, (counts, total) in sorted(_stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(STAGE_SECONDS, stage, bound, cumulative))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(STAGE_SECONDS, stage, total))
+            lines.append('{}_count{{stage="{}"}} {}'.format(STAGE_SECONDS, stage, cumulative))
+        for name, value in sorted(_counters.items()):
+            lines += ["# HELP {} {}".format(name, _HELP[name]), "# TYPE {} counter".format(name),
+                      "{} {}".format(name, value)]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # no log line per scrape
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """
+Serves the metrics over HTTP in a thread, only on the local host by default.
+    :param port: TCP port
+    :param host: address to listen on
+    :return: the http.server.ThreadingHTTPServer
+    """
+    enable()
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_file(path):
+    # replace the file at once, so a reader never sees half of it
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as metrics_file:
+        metrics_file.write(render())
+    os.replace(tmp_path, path)
+
+
+def write_periodically(path, interval=10.0):
+    """
+Rewrites the metrics file in a thread, e.g. for the textfile collector of the node exporter.
+    :param path: path of the metrics file
+    :param interval: seconds between writes
+    """
+    enable()
+
+    def writer():
+        while True:
+            time.sleep(interval)
+            try:
+                write_file(path)
+            except OSError as e:
+                print("Error while writing metrics: {}".format(e))
+
+    threading.Thread(target=writer, daemon=True).start()
@@ -0,0 +1,79 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+import metrics
+
+
+class OcrCache:
+    """
+Bounded LRU cache of ocr results. 7-segment displays only show a few different patterns,
+so the same binarized rois come up again and again.
+The key is a hash of the roi binarized at half intensity, like ssocr does, plus the ssocr arguments.
+When the cache is full the least recently used result is evicted. Hits, misses and evictions are counted in
+metrics.py.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        # the rois of a frame may be recognized in parallel threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(ssocr_args, img):
+        """
+Fingerprint of a roi and the ssocr arguments.
+        :param ssocr_args: list of ssocr arguments
+        :param img: the thresholded roi
+        :return: hashable key
+        """
+        binarized = np.packbits(np.asarray(img) >= 128)
+        digest = hashlib.blake2b(binarized.tobytes(), digest_size=16).digest()
+        args = tuple(arg for arg in ssocr_args if arg not in ("ssocr", "-"))
+        return img.shape, args, digest
+
+    def get(self, key):
+        """
+        :param key: key from OcrCache.key()
+        :return: the cached result or None
+        """
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        metrics.inc(metrics.OCR_CACHE_MISSES if result is None else metrics.OCR_CACHE_HITS)
+        return result
+
+    def put(self, key, result):
+        """
+Stores a result and evicts the least recently used one if the cache is full.
+        :param key: key from OcrCache.key()
+        :param result: the ocr result
+        """
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.inc(metrics.OCR_CACHE_EVICTIONS, evicted)
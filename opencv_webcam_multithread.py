@@ -1,15 +1,40 @@
 # coding=utf-8
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 import cv2
+import metrics
+import time
+
+# continuous: decode every frame of the cam, like before
+# paced: grab every frame without decoding it, decode only at the target frame rate
+# on-demand: grab every frame without decoding it, decode only when the reader asks for a new frame
+CAPTURE_MODES = ["continuous", "paced", "on-demand"]
 
 
 class WebcamVideoStream:
-    def __init__(self, src=0):
+    """
+Grabs frames in a thread into a ring of preallocated buffers.
+The reader borrows the newest frame read-only without a copy, the capture thread never writes into the
+newest or the borrowed buffer. Every frame gets a sequence number, so the reader can skip frames it already had.
+The reader is woken through a condition variable when a new frame is ready, see CAPTURE_MODES for the pacing.
+    """
+
+    def __init__(self, src=0, buffers=3, mode="continuous", fps=None):
+        if mode not in CAPTURE_MODES:
+            raise ValueError("Unknown capture mode {}, use one of {}".format(mode, CAPTURE_MODES))
         self.thread = Thread(target=self.update, args=())
         self.stream = cv2.VideoCapture(src)
-        (self.grabbed, self.frame) = self.stream.read()
+        (self.grabbed, frame) = self.stream.read()
+        # three buffers are enough: one newest, one borrowed by the reader, one being written
+        self._buffers = [frame] + [None] * (max(3, buffers) - 1)
+        self._newest = 0
+        self._borrowed = None
+        self.seq = 1 if self.grabbed else 0
         self.started = False
         self.read_lock = Lock()
+        self.frame_ready = Condition(self.read_lock)
+        self.mode = mode
+        self._interval = 1.0 / fps if fps else 0.0
+        self._wanted = False
 
     def start(self):
         if self.started:
@@ -19,21 +44,98 @@ class WebcamVideoStream:
         self.thread.start()
         return self
 
+    def _free_slot(self):
+        for slot in range(len(self._buffers)):
+            if slot != self._newest and slot != self._borrowed:
+                return slot
+
+    def _decode(self, retrieve):
+        """
+Decodes a frame into a free buffer and publishes it to the reader.
+        :param retrieve: decode the frame grabbed before instead of reading a new one
+        """
+        with self.read_lock:
+            slot = self._free_slot()
+        buffer = self._buffers[slot]
+        decode = self.stream.retrieve if retrieve else self.stream.read
+        if buffer is not None:
+            # decode straight into the preallocated buffer
+            (grabbed, stream_frame) = decode(buffer)
+        else:
+            (grabbed, stream_frame) = decode()
+        with self.frame_ready:
+            self.grabbed = grabbed
+            if grabbed:
+                self._buffers[slot] = stream_frame
+                self._newest = slot
+                self.seq += 1
+                self._wanted = False
+                self.frame_ready.notify_all()
+        return grabbed
+
     def update(self):
+        next_decode = time.monotonic()
         while self.started:
-            (grabbed, stream_frame) = self.stream.read()
-            self.read_lock.acquire()
-            self.grabbed, self.frame = grabbed, stream_frame
-            self.read_lock.release()
+            if self.mode == "continuous":
+                grabbed = self._decode(retrieve=False)
+            else:
+                # grab() only dequeues the frame, the expensive decoding is done by retrieve()
+                grabbed = self.stream.grab()
+                if grabbed and self.mode == "paced":
+                    now = time.monotonic()
+                    if now >= next_decode:
+                        next_decode = max(next_decode + self._interval, now)
+                        grabbed = self._decode(retrieve=True)
+                elif grabbed:
+                    with self.read_lock:
+                        wanted = self._wanted
+                    if wanted:
+                        grabbed = self._decode(retrieve=True)
+
+            if not grabbed:
+                with self.read_lock:
+                    self.grabbed = False
+                metrics.inc(metrics.CAMERA_GRAB_FAILURES)
+                # don't spin on a broken cam
+                time.sleep(0.01)
+
+    def wait(self, seq, timeout=None):
+        """
+Blocks until a frame newer than seq is ready.
+        :param seq: sequence number of the last processed frame
+        :param timeout: seconds to wait at most
+        :return: True if a newer frame is ready
+        """
+        with self.frame_ready:
+            if self.mode == "on-demand":
+                self._wanted = True
+            return self.frame_ready.wait_for(lambda: self.seq != seq or not self.started, timeout)
+
+    def read_seq(self):
+        """
+Borrows the newest frame until the next call.
+        :return: tuple of the sequence number and the read-only frame, frame is None if nothing was grabbed yet
+        """
+        if self.mode == "on-demand" and self.started:
+            # decode a fresh frame for this read
+            self.wait(self.seq, timeout=1.0)
+        with self.read_lock:
+            self._borrowed = self._newest
+            cam_frame = self._buffers[self._newest]
+            seq = self.seq
+        if cam_frame is None:
+            return seq, None
+        cam_frame = cam_frame.view()
+        cam_frame.flags.writeable = False
+        return seq, cam_frame
 
     def read(self):
-        self.read_lock.acquire()
-        cam_frame = self.frame.copy()
-        self.read_lock.release()
-        return cam_frame
+        return self.read_seq()[1]
 
     def stop(self):
-        self.started = False
+        with self.frame_ready:
+            self.started = False
+            self.frame_ready.notify_all()
         self.thread.join()
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -0,0 +1,168 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import cv2
+import numpy as np
+
+
+def source_box(crop, rotate, shape):
+    """
+Maps a crop box of a cv2.rotate()-ed image to the box in the source image that holds the same pixels.
+    :param crop: (y0, y1, x0, x1) in the rotated image
+    :param rotate: cv2.ROTATE_* code or None
+    :param shape: shape of the source image
+    :return: (y0, y1, x0, x1) in the source image
+    """
+    height, width = shape[:2]
+    if rotate in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE):
+        rotated_height, rotated_width = width, height
+    else:
+        rotated_height, rotated_width = height, width
+
+    # clip like numpy slicing of the rotated image would
+    y0, y1, x0, x1 = crop
+    y0, y1 = max(0, min(y0, rotated_height)), max(0, min(y1, rotated_height))
+    x0, x1 = max(0, min(x0, rotated_width)), max(0, min(x1, rotated_width))
+
+    if rotate is None:
+        return y0, y1, x0, x1
+    if rotate == cv2.ROTATE_180:
+        return height - y1, height - y0, width - x1, width - x0
+    if rotate == cv2.ROTATE_90_CLOCKWISE:
+        return height - x1, height - x0, y0, y1
+    if rotate == cv2.ROTATE_90_COUNTERCLOCKWISE:
+        return x0, x1, width - y1, width - y0
+    raise ValueError("Unknown rotation {}".format(rotate))
+
+
+def shift(correction, box):
+    """
+Shift of the display by a correction at the center of a box. The devices that crop the frame directly can only
+follow the translation part of a correction.
+    :param correction: 3x3 homography from the reference position of the display to where it is now,
+    see calibration.py, None for none
+    :param box: (y0, y1, x0, x1) in the source image
+    :return: (dx, dy) in whole pixels
+    """
+    if correction is None:
+        return 0, 0
+    y = (box[0] + box[1]) / 2.0
+    x = (box[2] + box[3]) / 2.0
+    w = correction[2, 0] * x + correction[2, 1] * y + correction[2, 2]
+    return (int(round((correction[0, 0] * x + correction[0, 1] * y + correction[0, 2]) / w - x)),
+            int(round((correction[1, 0] * x + correction[1, 1] * y + correction[1, 2]) / w - y)))
+
+
+def moved_box(box, correction, shape):
+    """
+Moves a crop box along with the display.
+    :param box: (y0, y1, x0, x1) in the source image
+    :param correction: 3x3 homography of the calibration of the cam, None for none
+    :param shape: shape of the source image
+    :return: the box moved by shift(), kept inside the image at its size
+    """
+    dx, dy = shift(correction, box)
+    y0, y1, x0, x1 = box
+    dy = max(-y0, min(dy, shape[0] - y1))
+    dx = max(-x0, min(dx, shape[1] - x1))
+    return y0 + dy, y1 + dy, x0 + dx, x1 + dx
+
+
+def translate(img, correction, dst=None):
+    """
+Moves the display in an image back to its reference position, by the shift() of the correction at the center of
+the image. For the devices that cut their rois at fixed positions from the whole frame.
+    :param img: the image, e.g. the gray frame
+    :param correction: 3x3 homography of the calibration of the cam, None for none
+    :param dst: array of the image size to write into, None to allocate it
+    :return: the translated image, img itself without a shift
+    """
+    dx, dy = shift(correction, (0, img.shape[0], 0, img.shape[1]))
+    if dx == 0 and dy == 0:
+        return img
+    return cv2.warpAffine(img, np.float64([[1, 0, dx], [0, 1, dy]]), img.shape[1::-1], dst=dst,
+                          flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+
+
+class CropPlan:
+    """
+The "rotate the whole frame, crop a window, convert to gray" chain of a device, rewritten to crop in source
+coordinates first, so the rotation and the gray conversion only touch the pixels of the window.
+    """
+
+    def __init__(self, crop, rotate=None, gray=True):
+        """
+        :param crop: (y0, y1, x0, x1) as used on the rotated image by the old chain
+        :param rotate: cv2.ROTATE_* code or None
+        :param gray: convert BGR to gray
+        """
+        self.crop = crop
+        self.rotate = rotate
+        self.gray = gray
+        self._boxes = {}
+
+    def _box(self, shape):
+        box = self._boxes.get(shape[:2])
+        if box is None:
+            box = self._boxes[shape[:2]] = source_box(self.crop, self.rotate, shape)
+        return box
+
+    def apply(self, img, workspace=None, correction=None):
+        """
+Runs the plan: crop in source coordinates, then gray conversion and rotation of the window only.
+        :param img: the frame from the cam
+        :param workspace: workspace.Workspace to write the gray and rotated window into, None to allocate them
+        :param correction: 3x3 homography of the calibration of the cam, the window follows its shift, None for none
+        :return: the same image as the old chain
+        """
+        y0, y1, x0, x1 = moved_box(self._box(img.shape), correction, img.shape)
+        window = img[y0:y1, x0:x1]
+        if self.gray and window.ndim == 3:
+            window = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY,
+                                  dst=None if workspace is None else workspace.array("plan_gray", window.shape[:2]))
+        if self.rotate is not None:
+            shape = window.shape
+            if self.rotate in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE):
+                shape = (shape[1], shape[0]) + shape[2:]
+            window = cv2.rotate(window, self.rotate,
+                                dst=None if workspace is None else workspace.array("plan_rotated", shape, window.dtype))
+        return window
+
+    def apply_naive(self, img):
+        """
+Runs the old chain: rotate the whole frame, crop, convert to gray. Only used for comparison.
+        :param img: the frame from the cam
+        :return: the processed image
+        """
+        rotated = cv2.rotate(img, self.rotate) if self.rotate is not None else img
+        y0, y1, x0, x1 = self.crop
+        window = rotated[y0:y1, x0:x1]
+        if self.gray and window.ndim == 3:
+            window = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+        return window
+
+    def pixels(self, shape, naive=False):
+        """
+Number of pixels the rotation and gray conversion read per frame.
+        :param shape: shape of the frame from the cam
+        :param naive: count the old chain instead of the plan
+        :return: number of pixels
+        """
+        y0, y1, x0, x1 = self._box(shape)
+        window = (y1 - y0) * (x1 - x0)
+        steps = int(self.gray) + int(self.rotate is not None)
+        if naive and self.rotate is not None:
+            return shape[0] * shape[1] + window * int(self.gray)
+        return window * steps
@@ -0,0 +1,113 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import time
+
+import cv2
+import numpy as np
+
+import result_buffer
+
+
+class VideoFileStream:
+    """
+Reads a recorded video in place of the cam, with the interface of WebcamVideoStream.
+There is no thread, every read decodes the next frame, so every frame of the file is processed
+as fast as the pipeline runs.
+    """
+
+    def __init__(self, path):
+        self.stream = cv2.VideoCapture(path)
+        if not self.stream.isOpened():
+            raise ValueError("Can't open video {}".format(path))
+        # frame rate of the recording, for the timestamps of the timeline
+        self.fps = self.stream.get(cv2.CAP_PROP_FPS) or None
+        self.seq = 0
+        self.finished = False
+
+    def start(self):
+        return self
+
+    def wait(self, seq, timeout=None):
+        return not self.finished
+
+    def read_seq(self):
+        """
+        :return: tuple of the frame number and the next frame, frame is None at the end of the video
+        """
+        (grabbed, frame) = self.stream.read()
+        if not grabbed:
+            self.finished = True
+            return self.seq, None
+        self.seq += 1
+        return self.seq, frame
+
+    def read(self):
+        return self.read_seq()[1]
+
+    def stop(self):
+        self.stream.release()
+
+
+def _stage_stats(seconds):
+    milliseconds = np.array(seconds) * 1000.0
+    return {"mean": float(milliseconds.mean()), "p50": float(np.percentile(milliseconds, 50)),
+            "p95": float(np.percentile(milliseconds, 95)), "max": float(milliseconds.max())}
+
+
+def run(ansprakon, stream):
+    """
+Processes every frame of a video and measures the processing steps.
+    :param ansprakon: Ansprakon reading from stream
+    :param stream: VideoFileStream
+    :return: report dict with frames, seconds, fps, per-stage latency in ms and the result timeline
+    """
+    timings = dict((stage, []) for stage in ansprakon.STAGES)
+    timeline = []
+    started = time.perf_counter()
+    while not stream.finished:
+        if not ansprakon.get_frame():
+            continue
+        result = ansprakon.step(lambda stage, seconds: timings[stage].append(seconds))
+        if not timeline or result_buffer.hashable(result) != result_buffer.hashable(timeline[-1]["result"]):
+            timeline.append({"frame": stream.seq,
+                             "time": stream.seq / stream.fps if stream.fps else None,
+                             "result": result})
+    seconds = time.perf_counter() - started
+    frames = len(timings[ansprakon.STAGES[0]])
+    return {"frames": frames,
+            "seconds": seconds,
+            "fps": frames / seconds if seconds else 0.0,
+            "stages": dict((stage, _stage_stats(times)) for stage, times in timings.items() if times),
+            "timeline": timeline}
+
+
+def print_report(report):
+    print("{} frames in {:.2f} s, {:.1f} fps".format(report["frames"], report["seconds"], report["fps"]))
+    print("{:<18} {:>9} {:>9} {:>9} {:>9}".format("stage [ms]", "mean", "p50", "p95", "max"))
+    for stage, stats in report["stages"].items():
+        print("{:<18} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(stage, stats["mean"], stats["p50"],
+                                                                 stats["p95"], stats["max"]))
+    print("result timeline:")
+    for change in report["timeline"]:
+        timestamp = "{:8.2f} s".format(change["time"]) if change["time"] is not None else ""
+        print("frame {:>6} {} {}".format(change["frame"], timestamp, change["result"]))
+
+
+def write_report(report, path):
+    with open(path, "w") as report_file:
+        # results of some devices are lists, json writes them as arrays
+        json.dump(report, report_file, indent=2, default=str)
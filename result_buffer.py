@@ -0,0 +1,123 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import threading
+
+import numpy as np
+
+
+def hashable(result):
+    """
+Some devices return the nested lists of the rois as result, device 5 even the unprocessed feat-rois.
+    :param result: the processed result of a frame
+    :return: a hashable key of the result, equal for equal results
+    """
+    if isinstance(result, list):
+        return tuple(hashable(item) for item in result)
+    if isinstance(result, np.ndarray):
+        return result.shape, result.dtype.str, result.tobytes()
+    return result
+
+
+class ResultBuffer:
+    """
+Ring buffer of the last results with counters kept up to date on every append,
+so the most common result and the count of a result are looked up in constant time.
+The GPIO callback thread reads the buffer while the main loop appends, all access is locked.
+    """
+
+    def __init__(self, capacity=30):
+        self.capacity = capacity
+        # hashable keys of the results, oldest first
+        self._results = collections.deque()
+        self._counts = {}
+        # key -> result, to return the result itself as mode
+        self._values = {}
+        # count -> set of the results with that count, the mode is any result in the highest bucket
+        self._buckets = collections.defaultdict(set)
+        self._max_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+    def _move(self, result, old_count, new_count):
+        if old_count:
+            self._buckets[old_count].discard(result)
+            if not self._buckets[old_count]:
+                del self._buckets[old_count]
+        if new_count:
+            self._buckets[new_count].add(result)
+            self._counts[result] = new_count
+        else:
+            del self._counts[result]
+            del self._values[result]
+
+    def append(self, result):
+        """
+Adds a result, the oldest result is dropped if the buffer is full.
+        :param result: the processed result
+        """
+        with self._lock:
+            if len(self._results) == self.capacity:
+                oldest = self._results.popleft()
+                count = self._counts[oldest]
+                self._move(oldest, count, count - 1)
+                if count == self._max_count and count not in self._buckets:
+                    self._max_count -= 1
+            key = hashable(result)
+            self._results.append(key)
+            self._values[key] = result
+            count = self._counts.get(key, 0)
+            self._move(key, count, count + 1)
+            self._max_count = max(self._max_count, count + 1)
+
+    def count(self, result, skip_newest=False):
+        """
+        :param result: the result to count
+        :param skip_newest: don't count the newest result
+        :return: number of times the result is in the buffer
+        """
+        key = hashable(result)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if skip_newest and self._results and self._results[-1] == key:
+                count -= 1
+            return count
+
+    def mode(self):
+        """
+        :return: the most common result, None if the buffer is empty
+        """
+        with self._lock:
+            if not self._max_count:
+                return None
+            return self._values[next(iter(self._buckets[self._max_count]))]
+
+    def recent(self, result, window, skip_newest=False):
+        """
+Checks if a result is among the newest results.
+        :param result: the result to look for
+        :param window: number of results to look at
+        :param skip_newest: start the window before the newest result
+        :return: True if the result is in the window
+        """
+        key = hashable(result)
+        with self._lock:
+            skip = 1 if skip_newest else 0
+            end = len(self._results) - skip
+            return any(self._results[index] == key for index in range(max(0, end - window), end))
@@ -15,6 +15,19 @@
 # along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
 import re
 
+# fixed texts of the devices by the read result
+DEVICE_9_DEFROST = {"d1": "Entfrosten Programm 1.", "d2": "Entfrosten Programm 2.", "d3": "Entfrosten Programm 3."}
+DEVICE_9_POWER = {"100p": "Leistung 100", "80p": "Leistung 80", "60p": "Leistung 60", "40p": "Leistung 40",
+                  "20p": "Leistung 20"}
+DEVICE_11_PROGRAMS = {"def1": "Entfrosten Programm 1", "def2": "Entfrosten Programm 2", "p100": "Programm 100"}
+
+# Fixed texts the process_results functions of a device can return, they are rendered in advance by
+# ansprakon.py --warm-up. Texts with free numbers like temperatures are left out.
+PHRASES = {
+    "9": list(DEVICE_9_DEFROST.values()) + list(DEVICE_9_POWER.values()),
+    "11": list(DEVICE_11_PROGRAMS.values()),
+}
+
 
 def process_results_device_0(rois_processed):
     """
@@ -231,31 +244,13 @@ SCHNEIDER Microwave
     print(read_result)
 
     if defrost_pattern.match(read_result):
-        if read_result == "d1":
-            results_processed = "Entfrosten Programm 1."
-            return results_processed
-        if read_result == "d2":
-            results_processed = "Entfrosten Programm 2."
-            return results_processed
-        if read_result == "d3":
-            results_processed = "Entfrosten Programm 3."
+        if read_result in DEVICE_9_DEFROST:
+            results_processed = DEVICE_9_DEFROST[read_result]
             return results_processed
 
     if power_pattern.match(read_result):
-        if read_result == "100p":
-            results_processed = "Leistung 100"
-            return results_processed
-        if read_result == "80p":
-            results_processed = "Leistung 80"
-            return results_processed
-        if read_result == "60p":
-            results_processed = "Leistung 60"
-            return results_processed
-        if read_result == "40p":
-            results_processed = "Leistung 40"
-            return results_processed
-        if read_result == "20p":
-            results_processed = "Leistung 20"
+        if read_result in DEVICE_9_POWER:
+            results_processed = DEVICE_9_POWER[read_result]
             return results_processed
 
     if time_pattern.match(read_result):
@@ -298,14 +293,8 @@ SEVERIN Microwave
     double_dot_upper = rois_processed[1][0]
     double_dot_lower = rois_processed[1][1]
 
-    if digits_1_2 + digits_3_4 == "def1":
-        return "Entfrosten Programm 1"
-
-    if digits_1_2 + digits_3_4 == "def2":
-        return "Entfrosten Programm 2"
-
-    if digits_1_2 + digits_3_4 == "p100":
-        return "Programm 100"
+    if digits_1_2 + digits_3_4 in DEVICE_11_PROGRAMS:
+        return DEVICE_11_PROGRAMS[digits_1_2 + digits_3_4]
 
     if digits_1_2 == "p":
         return "Programm " + digits_3_4
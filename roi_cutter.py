@@ -14,7 +14,20 @@
 # You should have received a copy of the GNU General Public License
 # along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
 import cv2
+import device_geometry
 import numpy as np
+import workspace
+
+# Every cutter is called as roi_device_ID(img, ws) with the workspace.Workspace of its pipeline.
+# The rois of devices 4, 5, 6 and 8 are views into the preprocessed image or are written into arrays of the
+# workspace that are reused by every frame, see workspace.py. They are only valid until the next frame.
+# Without a workspace the arrays are allocated on every call.
+KERNEL_3 = np.ones((3, 3), np.uint8)
+KERNEL_5 = np.ones((5, 5), np.uint8)
+
+
+def _workspace(ws):
+    return workspace.Workspace() if ws is None else ws
 
 
 def print_mouse_coords(event, x, y, flags, param):
@@ -26,7 +39,7 @@ def print_mouse_coords(event, x, y, flags, param):
         print("[" + str(r[1]) + ":" + str(r[1] + r[3]) + ", " + str(r[0]) + ":" + str(r[0] + r[2]) + "]")
 
 
-def roi_device_0(img):
+def roi_device_0(img, ws=None):
     """
 
     :param img:
@@ -37,7 +50,7 @@ def roi_device_0(img):
     return [ocr_rois, feat_detect_rois]
 
 
-def roi_device_1(img):
+def roi_device_1(img, ws=None):
     """
 BASETECH-Thermometer
     :param img:
@@ -48,7 +61,7 @@ BASETECH-Thermometer
     return [ocr_rois, []]
 
 
-def roi_device_2(img):
+def roi_device_2(img, ws=None):
     """
 ADE-Germany Human Scale
     :param img:
@@ -59,7 +72,7 @@ ADE-Germany Human Scale
     return [ocr_rois, []]
 
 
-def roi_device_3(img):
+def roi_device_3(img, ws=None):
     """
 Beurer Human Scale
     :param img:
@@ -70,80 +83,62 @@ Beurer Human Scale
     return [ocr_rois, []]
 
 
-def roi_device_4(img):
+def roi_device_4(img, ws=None):
     """
 NONAME indoor/outdoor thermometer
     :param img:
     :return:
     """
-    # ocr
-    indoor_temp = img[32:245, 117:517].copy()
-    outdoor_temp = img[260:480, 97:517].copy()
+    # ocr rois are cropped and warped in one step below
+    # indoor_temp = img[32:245, 117:517]
+    # outdoor_temp = img[260:480, 97:517]
 
-    # feat
-    indoor_indicator = img[28:73, 522:570].copy()
-    outdoor_indicator = img[258:301, 516:588].copy()
-    max_indicator = img[28:72, 24:111].copy()
-    min_indicator = img[256:303, 18:101].copy()
+    # the feature indicators are measured on img, see "features" in device_profiles.json
 
     # cv2.imshow("img", img)
     # cv2.imshow("indoor_temp", indoor_temp)
     # cv2.imshow("outdoor_temp", outdoor_temp)
 
-    indoor_temp_pts1 = np.float32([[31, 5], [394, 6], [5, 205], [371, 208]])
-    indoor_temp_pts2 = np.float32([[0, 0], [400, 0], [0, 212], [400, 212]])
-    indoor_temp_m = cv2.getPerspectiveTransform(indoor_temp_pts1, indoor_temp_pts2)
-    indoor_temp_dst = cv2.warpPerspective(indoor_temp, indoor_temp_m, (400, 212))
-
-    outdoor_temp_pts1 = np.float32([[31, 5], [415, 6], [5, 205], [395, 208]])
-    outdoor_temp_pts2 = np.float32([[0, 0], [420, 0], [0, 220], [420, 220]])
-    outdoor_temp__m = cv2.getPerspectiveTransform(outdoor_temp_pts1, outdoor_temp_pts2)
-    outdoor_temp_dst = cv2.warpPerspective(outdoor_temp, outdoor_temp__m, (420, 220))
-
-    # cv2.imshow("indoor warp", indoor_temp_dst)
-    # cv2.imshow("outdoor warp", outdoor_temp_dst)
-
+    ws = _workspace(ws)
     border_size = 10
 
-    indoor_warped_bordered = cv2.copyMakeBorder(indoor_temp_dst, top=border_size, bottom=border_size, left=border_size,
-                                                right=border_size,
-                                                borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
-    # cv2.imshow("bordered warp indoor", indoor_warped_bordered)
+    # the warps are written into the interior of white bordered arrays, the border is never touched again
+    indoor_warped_bordered, indoor_temp_dst = ws.bordered("4_indoor", (212, 400), border_size)
+    device_geometry.remap(img, [[31, 5], [394, 6], [5, 205], [371, 208]], (400, 212),
+                          crop=(32, 245, 117, 517), dst=indoor_temp_dst)
+    outdoor_warped_bordered, outdoor_temp_dst = ws.bordered("4_outdoor", (220, 420), border_size)
+    device_geometry.remap(img, [[31, 5], [415, 6], [5, 205], [395, 208]], (420, 220),
+                          crop=(260, 480, 97, 517), dst=outdoor_temp_dst)
 
-    outdoor_warped_bordered = cv2.copyMakeBorder(outdoor_temp_dst, top=border_size, bottom=border_size,
-                                                 left=border_size,
-                                                 right=border_size,
-                                                 borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    # cv2.imshow("bordered warp indoor", indoor_warped_bordered)
     # cv2.imshow("bordered warp outdoor", outdoor_warped_bordered)
 
-    kernel_2 = np.ones((3, 3), np.uint8)
-    indoor_warped_bordered_dilated = cv2.dilate(indoor_warped_bordered, kernel_2, iterations=1)
-    outdoor_warped_bordered_dilated = cv2.dilate(outdoor_warped_bordered, kernel_2, iterations=1)
+    indoor_warped_bordered_dilated = ws.dilate("4_indoor_dilated", indoor_warped_bordered, KERNEL_3)
+    outdoor_warped_bordered_dilated = ws.dilate("4_outdoor_dilated", outdoor_warped_bordered, KERNEL_3)
 
     # cv2.imshow("bordered warp indoor dil", indoor_warped_bordered_dilated)
     # cv2.imshow("bordered warp outdoor dil", outdoor_warped_bordered_dilated)
 
     # cv2.waitKey(1)
 
-    ocr_rois = [indoor_warped_bordered_dilated.copy(), outdoor_warped_bordered_dilated.copy()]
-    feat_rois = [indoor_indicator, outdoor_indicator, min_indicator, max_indicator]
+    ocr_rois = [indoor_warped_bordered_dilated, outdoor_warped_bordered_dilated]
 
-    return [ocr_rois, feat_rois]
+    return [ocr_rois, []]
 
 
-def roi_device_5(img):
+def roi_device_5(img, ws=None):
     """
 GREEN alarm radio
     :param img:
     :return:
     """
-    digits_1 = img[51:224, 35:310].copy()
-    digits_2 = img[45:217, 321:574].copy()
+    digits_1 = img[51:224, 35:310]
+    digits_2 = img[45:217, 321:574]
     ocr_rois = [digits_1, digits_2]
 
-    alarm_1 = img[195:222, 12:42].copy()
-    alarm_2 = img[199:226, 587:612].copy()
-    freq_shown = img[123:145, 582:606].copy()
+    alarm_1 = img[195:222, 12:42]
+    alarm_2 = img[199:226, 587:612]
+    freq_shown = img[123:145, 582:606]
 
     feat_rois = [alarm_1, alarm_2, freq_shown]
     # cv2.imshow("digits1", digits_1)
@@ -152,23 +147,19 @@ GREEN alarm radio
     return [ocr_rois, [feat_rois]]
 
 
-def roi_device_6(img):
+def roi_device_6(img, ws=None):
     """
 NONAME thermo-hygro
     :param img:
     :return:
     """
 
-    temp = img[3:155, 35:280].copy()
-    temp_decimal = img[33:151, 281:377].copy()
-    humidity = img[175:303, 111:312].copy()
+    # ocr rois are cropped and warped in one step below
+    # temp = img[3:155, 35:280]
+    # temp_decimal = img[33:151, 281:377]
+    # humidity = img[175:303, 111:312]
 
-    dry = img[276:305, 2:56].copy()
-    wet = img[80:112, 374:440].copy()
-    min_1 = img[89:121, 373:437].copy()
-    min_2 = img[269:300, 337:396].copy()
-    max_1 = img[114:143, 376:439].copy()
-    max_2 = img[271:296, 394:446].copy()
+    # the feature indicators dry, wet, min and max are measured on img, see "features" in device_profiles.json
     # cv2.imshow("uncut", img)
     # cv2.imshow("temp", temp)
     # cv2.imshow("temp_deci", temp_decimal)
@@ -178,48 +169,25 @@ NONAME thermo-hygro
     # cv2.imshow("3",min_2)
     # cv2.imshow("4",max_2)
     # cv2.waitKey(1)
+    ws = _workspace(ws)
     border_size = 10
-    temp_height, temp_width = temp.shape
-
-    temp_pts1 = np.float32([[33, 8], [239, 6], [24, 141], [228, 140]])
-    temp_pts2 = np.float32([[0, 0], [temp_width, 0], [0, temp_height], [temp_width, temp_height]])
-    temp_m = cv2.getPerspectiveTransform(temp_pts1, temp_pts2)
-    temp_dst = cv2.warpPerspective(temp, temp_m, (temp_width, temp_height))
 
-    temp_bordered = cv2.copyMakeBorder(temp_dst, top=border_size, bottom=border_size, left=border_size,
-                                       right=border_size,
-                                       borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    # the warps are written into the interior of white bordered arrays, the border is never touched again
+    temp_bordered, temp_dst = ws.bordered("6_temp", (152, 245), border_size)
+    device_geometry.remap(img, [[33, 8], [239, 6], [24, 141], [228, 140]], crop=(3, 155, 35, 280), dst=temp_dst)
 
-    temp_decimal_height, temp_decimal_width = temp_decimal.shape
-    temp_decimal_pts1 = np.float32([[14, 7], [81, 5], [10, 110], [77, 106]])
-    temp_decimal_pts2 = np.float32([[0, 0], [temp_decimal_width, 0],
-                                    [0, temp_decimal_height], [temp_decimal_width, temp_decimal_height]])
-
-    temp_decimal__m = cv2.getPerspectiveTransform(temp_decimal_pts1, temp_decimal_pts2)
-    temp_decimal_dst = cv2.warpPerspective(temp_decimal, temp_decimal__m, (temp_decimal_width, temp_decimal_height))
-
-    temp_decimal_bordered = cv2.copyMakeBorder(temp_decimal_dst, top=border_size, bottom=border_size,
-                                               left=border_size,
-                                               right=border_size,
-                                               borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    temp_decimal_bordered, temp_decimal_dst = ws.bordered("6_temp_decimal", (118, 96), border_size)
+    device_geometry.remap(img, [[14, 7], [81, 5], [10, 110], [77, 106]], crop=(33, 151, 281, 377),
+                          dst=temp_decimal_dst)
     # cv2.imshow("bordered warp temp_decimal", temp_decimal_bordered)
 
-    humidity_height, humidity_width = humidity.shape
-
-    humidity_pts1 = np.float32([[27, 6], [186, 8], [14, 116], [182, 117]])
-    humidity_pts2 = np.float32([[0, 0], [humidity_width, 0], [0, humidity_height], [humidity_width, humidity_height]])
-    humidity__m = cv2.getPerspectiveTransform(humidity_pts1, humidity_pts2)
-    humidity_dst = cv2.warpPerspective(humidity, humidity__m, (humidity_width, humidity_height))
-
-    humidity_bordered = cv2.copyMakeBorder(humidity_dst, top=border_size, bottom=border_size,
-                                           left=border_size,
-                                           right=border_size,
-                                           borderType=cv2.BORDER_CONSTANT, value=[255, 255, ])
+    humidity_bordered, humidity_dst = ws.bordered("6_humidity", (128, 201), border_size)
+    device_geometry.remap(img, [[27, 6], [186, 8], [14, 116], [182, 117]], crop=(175, 303, 111, 312),
+                          dst=humidity_dst)
     # cv2.imshow("bordered warp humidity", humidity_bordered)
 
-    kernel_1 = np.ones((5, 5), np.uint8)
-    temp_bordered_dilated = cv2.dilate(temp_bordered, kernel_1, iterations=2)
-    humidity_bordered_dilated = cv2.dilate(humidity_bordered, kernel_1, iterations=2)
+    temp_bordered_dilated = ws.dilate("6_temp_dilated", temp_bordered, KERNEL_5, iterations=2)
+    humidity_bordered_dilated = ws.dilate("6_humidity_dilated", humidity_bordered, KERNEL_5, iterations=2)
 
     # cv2.imshow("temp dilated", temp_bordered_dilated)
     # cv2.imshow("humidity dilated", humidity_bordered_dilated)
@@ -232,11 +200,10 @@ NONAME thermo-hygro
     # cv2.waitKey(1)
 
     ocr_rois = [temp_bordered_dilated, temp_decimal_bordered, humidity_bordered]
-    feat_detect_rois = [dry, wet, min_1, max_1, min_2, max_2]
-    return [ocr_rois, feat_detect_rois]
+    return [ocr_rois, []]
 
 
-def roi_device_7(display):
+def roi_device_7(display, ws=None):
     """
 CASIO calculator MS-20UC
     :param img:
@@ -245,10 +212,7 @@ CASIO calculator MS-20UC
     # cv2.equalizeHist(display, display)
     border_size = 10
     white = [255, 255, 255]
-    display_pts1 = np.float32([[36, 58], [569, 58], [31, 175], [558, 179]])
-    display_pts2 = np.float32([[0, 0], [570, 0], [0, 180], [570, 180]])
-    display__m = cv2.getPerspectiveTransform(display_pts1, display_pts2)
-    display_dst = cv2.warpPerspective(display, display__m, (570, 180))
+    display_dst = device_geometry.remap(display, [[36, 58], [569, 58], [31, 175], [558, 179]], (570, 180))
 
     display_bordered = cv2.copyMakeBorder(display_dst, top=border_size, bottom=border_size,
                                           left=border_size,
@@ -300,7 +264,7 @@ CASIO calculator MS-20UC
     return [ocr_rois, feat_detect_rois]
 
 
-def roi_device_8(img):
+def roi_device_8(img, ws=None):
     """
 IDR radio alarmclock
     :param imgs:
@@ -311,33 +275,13 @@ IDR radio alarmclock
     #
     # cv2.setMouseCallback("1", print_mouse_coords)
 
-    kernel_1 = np.ones((3, 3), np.uint8)
-
-    digits_1_2 = img[1][0:154, 0:238].copy()
-    digits_3_4 = img[1][1:160, 311:595].copy()
-
-    double_dot_lower = img[1][99:126, 275:307].copy()
-    double_dot_upper = img[1][10:68, 300:317].copy()
-
-    decimal_dot = img[1][127:158, 437:479].copy()
+    digits_1_2 = img[1][0:154, 0:238]
+    digits_3_4 = img[1][1:160, 311:595]
 
-    left_points = img[0][14:160, 13:74].copy()
-    left_points_dilated = cv2.dilate(left_points, kernel_1, iterations=2)
-    # left_point_1 = None
-    left_point_2 = left_points_dilated[62:78, 8:33].copy()
-    left_point_3 = left_points_dilated[97:124, 8:33].copy()
-
-    right_points = img[0][20:160, 530:595].copy()
-    right_points_dilted = cv2.dilate(right_points, kernel_1, iterations=2)
-    right_point_1 = right_points_dilted[20:38, 13:36].copy()
-    right_point_2 = right_points_dilted[56:74, 21:41].copy()
-    right_point_3 = right_points_dilted[95:112, 25:49].copy()
+    # the double dot, the decimal dot and the alarm points left and right are measured on img[1] and on the
+    # dilated point areas of img[0], see "features" in device_profiles.json
 
     ocr_rois = [digits_1_2, digits_3_4]
-    feat_detect_rois = [double_dot_lower, double_dot_upper,
-                        decimal_dot,
-                        left_point_2, left_point_3,
-                        right_point_1, right_point_2, right_point_3]
 
     # cv2.imshow("1", digits_1_2)
     # cv2.imshow("2", digits_3_4)
@@ -350,10 +294,10 @@ IDR radio alarmclock
     # cv2.imshow("10", )
     # cv2.waitKey(1)
 
-    return [ocr_rois, feat_detect_rois]
+    return [ocr_rois, []]
 
 
-def roi_device_9(img):
+def roi_device_9(img, ws=None):
     """
 
     :param img:
@@ -362,8 +306,7 @@ def roi_device_9(img):
 
     digit_1_2 = img[2:192, 1:295].copy()
     digit_3_4 = img[7:198, 324:627].copy()
-    double_dot_lower = img[125:146, 299:319].copy()
-    double_dot_upper = img[46:75, 298:328].copy()
+    # the double dot is measured on img, see "features" in device_profiles.json
 
     # cv2.imshow("1", img)
     # cv2.imshow("2", digit_1_2)
@@ -373,11 +316,10 @@ def roi_device_9(img):
     # cv2.waitKey(1)
 
     ocr_rois = [digit_1_2, digit_3_4]
-    feat_detect_rois = [double_dot_lower, double_dot_upper]
-    return [ocr_rois, feat_detect_rois]
+    return [ocr_rois, []]
 
 
-def roi_device_10(img):
+def roi_device_10(img, ws=None):
     """
 THERMO
     :param img:
@@ -399,32 +341,30 @@ THERMO
     return [ocr_rois, feat_detect_rois]
 
 
-def roi_device_11(img):
+def roi_device_11(img, ws=None):
     """
 
     :param img:
     :return:
     """
 
-    double_dot_upper = img[45:72, 315:344].copy()
-    double_dot_lower = img[133:164, 317:348].copy()
+    # the double dot is measured on img, see "features" in device_profiles.json
 
     digits_1_2 = img[0:200, 0:306].copy()
     digits_3_4 = img[0:202, 354:639].copy()
 
     ocr_rois = [digits_1_2, digits_3_4]
-    feat_detect_rois = [double_dot_upper, double_dot_lower]
 
     # cv2.imshow("all", img)
     # cv2.imshow("digits_1-2", digits_1_2)
     # cv2.imshow("digits_3-4", digits_3_4)
     # cv2.waitKey(1)
 
-    return [ocr_rois, feat_detect_rois]
+    return [ocr_rois, []]
 
 
 # Device ID 12
-def roi_device_12(img):
+def roi_device_12(img, ws=None):
     """
 Bloodpressure
     :param img: the image to process
@@ -477,7 +417,7 @@ Bloodpressure
     return [ocr_rois, feat_detect_rois]
 
 
-def roi_device_XX(img):
+def roi_device_XX(img, ws=None):
     """
 BEKO Dishwasher
     :param img:
@@ -501,7 +441,7 @@ BEKO Dishwasher
     return [ocr_rois, feat_detect_rois]
 
 
-def roi_device_13(img):
+def roi_device_13(img, ws=None):
     """
 BASETECH piggybank
     :param img:
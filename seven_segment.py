@@ -0,0 +1,314 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import functools
+import re
+
+import numpy as np
+
+# segment bits, named like on the usual 7-segment datasheets
+#  aaa
+# f   b
+#  ggg
+# e   c
+#  ddd
+SEG_A = 1
+SEG_B = 2
+SEG_C = 4
+SEG_D = 8
+SEG_E = 16
+SEG_F = 32
+SEG_G = 64
+
+# segment patterns as recognized by ssocr with the "full" charset
+CHARSET_FULL = {
+    SEG_A | SEG_B | SEG_C | SEG_D | SEG_E | SEG_F: "0",
+    SEG_B | SEG_C: "1",
+    SEG_A | SEG_B | SEG_D | SEG_E | SEG_G: "2",
+    SEG_A | SEG_B | SEG_C | SEG_D | SEG_G: "3",
+    SEG_B | SEG_C | SEG_F | SEG_G: "4",
+    SEG_A | SEG_C | SEG_D | SEG_F | SEG_G: "5",
+    SEG_A | SEG_C | SEG_D | SEG_E | SEG_F | SEG_G: "6",
+    SEG_A | SEG_B | SEG_C: "7",
+    SEG_A | SEG_B | SEG_C | SEG_F: "7",
+    SEG_A | SEG_B | SEG_C | SEG_D | SEG_E | SEG_F | SEG_G: "8",
+    SEG_A | SEG_B | SEG_C | SEG_D | SEG_F | SEG_G: "9",
+    SEG_A | SEG_B | SEG_C | SEG_F | SEG_G: "9",
+    SEG_A | SEG_B | SEG_C | SEG_E | SEG_F | SEG_G: "a",
+    SEG_C | SEG_D | SEG_E | SEG_F | SEG_G: "b",
+    SEG_D | SEG_E | SEG_G: "c",
+    SEG_A | SEG_D | SEG_E | SEG_F: "c",
+    SEG_B | SEG_C | SEG_D | SEG_E | SEG_G: "d",
+    SEG_A | SEG_D | SEG_E | SEG_F | SEG_G: "e",
+    SEG_A | SEG_E | SEG_F | SEG_G: "f",
+    SEG_C | SEG_E | SEG_F | SEG_G: "h",
+    SEG_B | SEG_C | SEG_E | SEG_F | SEG_G: "h",
+    SEG_D | SEG_E | SEG_F: "l",
+    SEG_C | SEG_E | SEG_G: "n",
+    SEG_C | SEG_D | SEG_E | SEG_G: "o",
+    SEG_A | SEG_B | SEG_E | SEG_F | SEG_G: "p",
+    SEG_E | SEG_G: "r",
+    SEG_C | SEG_D | SEG_E: "u",
+    SEG_B | SEG_C | SEG_D | SEG_E | SEG_F: "u",
+    SEG_G: "-",
+}
+
+# the "digits" charset only knows digits, a 6 without the top segment is read as 6 instead of b
+CHARSET_DIGITS = dict((pattern, char) for pattern, char in CHARSET_FULL.items() if char.isdigit())
+CHARSET_DIGITS[SEG_C | SEG_D | SEG_E | SEG_F | SEG_G] = "6"
+
+CHARSETS = {
+    "full": CHARSET_FULL,
+    "digits": CHARSET_DIGITS,
+}
+
+UNKNOWN_CHAR = "_"
+
+# ratios used by ssocr to tell decimal points apart from digits
+DEC_H_RATIO = 5
+DEC_W_RATIO = 2
+
+
+class SsocrOptions:
+    """
+The subset of the ssocr command line options used by AnSpraKon.
+    """
+
+    def __init__(self):
+        self.number_digits = -1
+        self.ignore_pixels = 0
+        self.number_pixels = 1
+        self.one_ratio = 3.0
+        self.minus_ratio = 2.0
+        self.omit_decimal_point = False
+        self.charset = "full"
+
+
+def _leading_number(value):
+    """
+Parses the number at the start of an argument, the way atoi/atof in ssocr would.
+Catches arguments like "400-C" that were concatenated by a missing comma.
+    :param value: the argument string
+    :return: the parsed float, or None if the argument does not start with a number
+    """
+    match = re.match(r"\s*-?\d+(\.\d+)?", value)
+    return float(match.group(0)) if match else None
+
+
+def _number(value, default, cast=float):
+    """
+    :param value: the argument string
+    :param default: returned if the argument does not start with a number
+    :param cast: type of the returned number
+    :return: the leading number of the argument, 0 included
+    """
+    number = _leading_number(value)
+    return default if number is None else cast(number)
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_args(ssocr_args):
+    options = SsocrOptions()
+    # split combined arguments like "-c digits" into their parts
+    tokens = [token for arg in ssocr_args for token in arg.split()]
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else ""
+
+        if token in ("-d", "--number-digits"):
+            options.number_digits = _number(value, options.number_digits, int)
+            i += 1
+        elif token in ("-i", "--ignore-pixels"):
+            options.ignore_pixels = _number(value, options.ignore_pixels, int)
+            i += 1
+        elif token in ("-n", "--number-pixels"):
+            options.number_pixels = _number(value, options.number_pixels, int)
+            i += 1
+        elif token in ("-r", "--one-ratio"):
+            options.one_ratio = _number(value, options.one_ratio)
+            i += 1
+        elif token in ("-m", "--minus-ratio"):
+            options.minus_ratio = _number(value, options.minus_ratio)
+            i += 1
+        elif token in ("-c", "--charset"):
+            options.charset = value if value in CHARSETS else "full"
+            i += 1
+        elif token in ("-C", "--omit-decimal-point"):
+            options.omit_decimal_point = True
+        # "-D" only writes a debug image, "ssocr" and "-" are added by call_ssocr, everything else is ignored
+        i += 1
+
+    return options
+
+
+def parse_args(ssocr_args):
+    """
+Parses a ssocr argument list into SsocrOptions, results are cached per argument list.
+    :param ssocr_args: list of ssocr arguments as used in ssocr.py
+    :return: SsocrOptions
+    """
+    return _parse_args(tuple(ssocr_args))
+
+
+def _runs(mask):
+    """
+Finds the runs of True in a 1D boolean array.
+    :param mask: 1D boolean numpy array
+    :return: array of [start, end] pairs, end inclusive
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return changes.reshape(-1, 2) - [0, 1]
+
+
+def _find_digits(foreground, ignore_pixels):
+    """
+Scans the columns for digits and then the rows of every digit for its top and bottom, like ssocr does.
+    :param foreground: boolean image, True where the display is lit
+    :param ignore_pixels: number of pixels per column/row that are ignored
+    :return: list of (x1, y1, x2, y2) boxes, coordinates inclusive
+    """
+    digits = []
+    columns = np.count_nonzero(foreground, axis=0) > ignore_pixels
+    for x1, x2 in _runs(columns):
+        rows = np.flatnonzero(np.count_nonzero(foreground[:, x1:x2 + 1], axis=1) > ignore_pixels)
+        if rows.size:
+            digits.append((x1, rows[0], x2, rows[-1]))
+    return digits
+
+
+def _scan_segments(line, number_pixels):
+    """
+Finds the segments crossed by a scan line.
+    :param line: 1D boolean array along the scan line
+    :param number_pixels: number of lit pixels needed to count as a segment
+    :return: list of run centres of the segments crossed
+    """
+    return [(start + end) / 2.0 for start, end in _runs(line) if end - start + 1 >= number_pixels]
+
+
+def _segments(digit, number_pixels):
+    """
+Determines which segments of a digit are lit.
+Scans the middle column for the horizontal segments and the rows at 1/4 and 3/4 height for the vertical ones.
+    :param digit: boolean image of a single digit
+    :param number_pixels: number of lit pixels needed to count as a segment
+    :return: the segment bits
+    """
+    height, width = digit.shape
+    pattern = 0
+
+    for y in _scan_segments(digit[:, width // 2], number_pixels):
+        if y < height / 3.0:
+            pattern |= SEG_A
+        elif y < 2 * height / 3.0:
+            pattern |= SEG_G
+        else:
+            pattern |= SEG_D
+
+    for x in _scan_segments(digit[height // 4, :], number_pixels):
+        pattern |= SEG_F if x < width / 2.0 else SEG_B
+
+    for x in _scan_segments(digit[3 * height // 4, :], number_pixels):
+        pattern |= SEG_E if x < width / 2.0 else SEG_C
+
+    return pattern
+
+
+def to_foreground(img):
+    """
+Converts an image to a boolean foreground mask, dark pixels are the lit segments like in ssocr's default mode.
+    :param img: grayscale or BGR image as numpy array
+    :return: boolean numpy array
+    """
+    if img.ndim == 3:
+        img = img.mean(axis=2)
+    return img < 128
+
+
+def recognize(img, ssocr_args):
+    """
+Recognizes the digits in a thresholded image without calling ssocr.
+Understands the ssocr options used in ssocr.py and returns the same string ssocr would print.
+    :param img: thresholded image in CV2-MAT format, dark digits on white background
+    :param ssocr_args: list of ssocr arguments
+    :return: the recognized characters followed by a newline, empty string if nothing was found
+    """
+    options = parse_args(ssocr_args)
+    charset = CHARSETS[options.charset]
+    foreground = to_foreground(img)
+
+    digits = _find_digits(foreground, options.ignore_pixels)
+    if not digits:
+        return ""
+    if 0 < options.number_digits != len(digits):
+        # ssocr fails if the wrong number of digits is found
+        return ""
+
+    max_height = max(y2 - y1 + 1 for x1, y1, x2, y2 in digits)
+    max_width = max(x2 - x1 + 1 for x1, y1, x2, y2 in digits)
+
+    result = ""
+    for x1, y1, x2, y2 in digits:
+        height = y2 - y1 + 1
+        width = x2 - x1 + 1
+
+        if height < max_height / DEC_H_RATIO and width < max_width / DEC_W_RATIO:
+            if not options.omit_decimal_point:
+                result += "."
+        elif height / float(width) > options.one_ratio:
+            result += "1"
+        elif width / float(height) > options.minus_ratio:
+            result += "-" if "-" in charset.values() else UNKNOWN_CHAR
+        else:
+            pattern = _segments(foreground[y1:y2 + 1, x1:x2 + 1], options.number_pixels)
+            result += charset.get(pattern, UNKNOWN_CHAR)
+
+    return result + "\n"
+
+
+def confidence(img, ssocr_args):
+    """
+Estimates how clean the digits of a thresholded roi are, from the fill of their segments.
+Every segment crossed by a scan line should be about as thick as the other segments of the digit,
+thin runs are noise or broken segments. Works for rois read by ssocr as well.
+    :param img: thresholded image in CV2-MAT format, dark digits on white background
+    :param ssocr_args: list of ssocr arguments
+    :return: confidence between 0 and 1 of the weakest digit, 0 if no digit was found
+    """
+    if img is None:
+        return 0.0
+    options = parse_args(ssocr_args)
+    foreground = to_foreground(img)
+    digits = _find_digits(foreground, options.ignore_pixels)
+    if not digits:
+        return 0.0
+
+    max_height = max(y2 - y1 + 1 for x1, y1, x2, y2 in digits)
+    weakest = 1.0
+    for x1, y1, x2, y2 in digits:
+        digit = foreground[y1:y2 + 1, x1:x2 + 1]
+        height, width = digit.shape
+        if height < max_height / DEC_H_RATIO:
+            # decimal points have no segments
+            continue
+        runs = [end - start + 1 for line in (digit[:, width // 2], digit[height // 4, :], digit[3 * height // 4, :])
+                for start, end in _runs(line)]
+        if not runs:
+            continue
+        thickness = float(np.median(runs))
+        weakest = min(weakest, min(runs) / thickness)
+    return weakest
@@ -0,0 +1,139 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import os
+import subprocess
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                                 "ansprakon", "speech")
+
+
+class SpeechCache:
+    """
+Cache of WAV files rendered by nanoTTS, the results of a device repeat constantly.
+A cached text is played with aplay at once instead of being synthesized again.
+The files are keyed by the text and the voice options, the least recently played files are deleted
+when the cache grows above its size.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=50 * 1024 * 1024):
+        """
+        :param cache_dir: directory of the WAV files
+        :param max_bytes: size of the cache on disk
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._evict_lock = threading.Lock()
+
+    def path(self, nanotts_options, text):
+        """
+        :param nanotts_options: flags for nanoTTS, the voice is part of the key
+        :param text: the String to speak
+        :return: path of the WAV file of the text
+        """
+        key = "\0".join([str(option) for option in nanotts_options] + [text])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".wav")
+
+    def render(self, nanotts_options, text):
+        """
+Synthesizes a text into the cache if it is not cached yet.
+        :param nanotts_options: flags for nanoTTS
+        :param text: the String to speak
+        :return: path of the WAV file, None if nanoTTS failed
+        """
+        path = self.path(nanotts_options, text)
+        if os.path.exists(path):
+            return path
+        # render to a temporary file, so a half written file is never played
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        nanotts_flags = ["nanotts-git"] + nanotts_options + ["-o", tmp_path, '"' + text + '"']
+        try:
+            returncode = subprocess.call(nanotts_flags, stdout=subprocess.DEVNULL)
+        except OSError as e:
+            print("Error while rendering speech: {}".format(e))
+            return None
+        if returncode != 0 or not os.path.exists(tmp_path):
+            print("Error code {} while rendering speech.".format(returncode))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def start(self, nanotts_options, text="Ansprakon bereit."):
+        """
+Plays a text from the cache, renders it first on a miss. Same interface as call_nanotts.start_nanotts.
+        :param nanotts_options: flags for nanoTTS
+        :param text: the String to speak
+        :return: the subprocess.Popen of aplay, None if the text could not be played
+        """
+        path = self.path(nanotts_options, text)
+        if os.path.exists(path):
+            self.hits += 1
+            # the modification time is the last use of the file for the eviction
+            os.utime(path)
+        else:
+            self.misses += 1
+            path = self.render(nanotts_options, text)
+            if path is None:
+                return None
+        try:
+            return subprocess.Popen(["aplay", "-q", path], stdout=subprocess.DEVNULL)
+        except OSError as e:
+            print("Error while playing speech: {}".format(e))
+            return None
+
+    def call(self, nanotts_options, text="Ansprakon bereit."):
+        """
+Plays a text from the cache and waits until it is spoken, same interface as call_nanotts.call_nanotts.
+        """
+        process = self.start(nanotts_options, text)
+        if process is not None:
+            process.wait()
+
+    def warm_up(self, nanotts_options, phrases):
+        """
+Renders phrases in advance, e.g. result_processor.PHRASES of the device.
+        :param nanotts_options: flags for nanoTTS
+        :param phrases: list of texts
+        """
+        for text in phrases:
+            self.render(nanotts_options, text)
+
+    def evict(self):
+        """
+Deletes the least recently played files until the cache fits into max_bytes.
+        """
+        with self._evict_lock:
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".wav"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,172 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import re
+import subprocess
+import threading
+import wave
+
+# numbers with an optional decimal part, or the text between numbers
+_TOKEN = re.compile(r"(\d+)(?:[.,](\d+))?|(\D+)")
+# units are spoken as words
+_UNITS = [("°C", " Grad "), ("%", " Prozent ")]
+# punctuation that only separates the fragments, any other character has no fragment, e.g. the minus of "-5"
+_SEPARATORS = re.compile(r"[\s.,:;!?]+")
+# numbers up to this are rendered as one fragment, longer numbers fall back to synthesizing the whole text
+MAX_NUMBER = 999
+# fragments of the result texts that are not numbers, rendered in advance by warm_up
+WORDS = ["Komma", "Grad", "Prozent", "Kilogramm", "Minuten", "Sekunden", "Minuten und", "Uhr", "Mhz",
+         "Temperatur", "Luftfeuchtigkeit", "Noch", "Blutdruck", "zu", "Puls"]
+
+
+def fragments(text):
+    """
+Splits a result text into fragments that are rendered once and spliced at runtime.
+"Temperatur 23.4°C." becomes ["Temperatur", "23", "Komma", "4", "Grad"].
+    :param text: the String to speak
+    :return: list of fragments, None if the text has a number above MAX_NUMBER or a character without a fragment,
+    like "-5" or ".5", those texts are synthesized whole so they are spoken the same by every engine
+    """
+    result = []
+    for match in _TOKEN.finditer(text):
+        number, decimals, words = match.groups()
+        if words is not None:
+            for unit, spoken in _UNITS:
+                words = words.replace(unit, spoken)
+            if _SEPARATORS.sub("", re.sub(r"[^\W_]+", "", words)):
+                return None
+            # a decimal mark without digits in front, e.g. ".5"
+            if words[-1] in ".," and match.end() < len(text):
+                return None
+            # punctuation only separates the fragments
+            words = " ".join(re.findall(r"[^\W_]+", words))
+            if words:
+                result.append(words)
+            continue
+        if int(number) > MAX_NUMBER:
+            return None
+        result.append(str(int(number)))
+        if decimals is not None:
+            # decimals are read digit by digit
+            result.append("Komma")
+            result.extend(decimals)
+    return result
+
+
+class SpeechConcat:
+    """
+Speaks result texts by splicing the PCM of pre-rendered fragments, numbers 0-999, units and fixed words.
+No nanoTTS process runs per text, aplay starts playing at once. The fragments are stored in a
+speech_cache.SpeechCache and kept in memory once loaded.
+    """
+
+    def __init__(self, cache, loaded=512):
+        """
+        :param cache: speech_cache.SpeechCache that renders and stores the fragments
+        :param loaded: number of fragments kept in memory
+        """
+        self.cache = cache
+        self.loaded = loaded
+        # (nanotts options, fragment) -> loaded fragment, least recently used first
+        self._fragments = collections.OrderedDict()
+
+    def _load(self, nanotts_options, fragment):
+        # only loaded fragments are kept, a fragment that failed, e.g. while the cache is filled, is tried again
+        key = (nanotts_options, fragment)
+        loaded = self._fragments.get(key)
+        if loaded is not None:
+            self._fragments.move_to_end(key)
+            return loaded
+        path = self.cache.render(list(nanotts_options), fragment)
+        if path is None:
+            return None
+        with wave.open(path, "rb") as wav:
+            loaded = self._fragments[key] = wav.getparams()[:3], wav.readframes(wav.getnframes())
+        if len(self._fragments) > self.loaded:
+            self._fragments.popitem(last=False)
+        return loaded
+
+    def pcm(self, nanotts_options, text):
+        """
+Splices the PCM of the fragments of a text.
+        :param nanotts_options: flags for nanoTTS
+        :param text: the String to speak
+        :return: tuple of ((channels, sample width, frame rate), PCM bytes), None if the text can't be spliced
+        """
+        text_fragments = fragments(text)
+        if not text_fragments:
+            return None
+        params = None
+        frames = []
+        for fragment in text_fragments:
+            loaded = self._load(tuple(nanotts_options), fragment)
+            if loaded is None or (params is not None and loaded[0] != params):
+                return None
+            params = loaded[0]
+            frames.append(loaded[1])
+        return params, b"".join(frames)
+
+    def start(self, nanotts_options, text="Ansprakon bereit."):
+        """
+Starts speaking a text, same interface as call_nanotts.start_nanotts.
+Texts that can't be spliced are played from the speech cache.
+        :param nanotts_options: flags for nanoTTS
+        :param text: the String to speak
+        :return: the subprocess.Popen of aplay, None if the text could not be played
+        """
+        spliced = self.pcm(nanotts_options, text)
+        if spliced is None:
+            return self.cache.start(nanotts_options, text)
+        (channels, sample_width, frame_rate), frames = spliced
+        aplay_flags = ["aplay", "-q", "-t", "raw", "-f", "S{}_LE".format(8 * sample_width),
+                       "-r", str(frame_rate), "-c", str(channels), "-"]
+        try:
+            process = subprocess.Popen(aplay_flags, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        except OSError as e:
+            print("Error while playing speech: {}".format(e))
+            return None
+        # aplay reads the samples while it plays, feed them from a thread so start() returns at once
+        threading.Thread(target=_feed, args=(process, frames), daemon=True).start()
+        return process
+
+    def call(self, nanotts_options, text="Ansprakon bereit."):
+        """
+Speaks a text and waits until it is spoken, same interface as call_nanotts.call_nanotts.
+        """
+        process = self.start(nanotts_options, text)
+        if process is not None:
+            process.wait()
+
+    def warm_up(self, nanotts_options, phrases=()):
+        """
+Renders all numbers up to MAX_NUMBER, the WORDS and the fragments of phrases in advance.
+        :param nanotts_options: flags for nanoTTS
+        :param phrases: list of texts, e.g. result_processor.PHRASES of the device
+        """
+        for fragment in WORDS + [str(number) for number in range(MAX_NUMBER + 1)]:
+            self.cache.render(nanotts_options, fragment)
+        for text in phrases:
+            for fragment in fragments(text) or []:
+                self.cache.render(nanotts_options, fragment)
+
+
+def _feed(process, frames):
+    try:
+        process.stdin.write(frames)
+        process.stdin.close()
+    except (BrokenPipeError, ValueError):
+        # the speech was cancelled
+        pass
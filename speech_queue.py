@@ -0,0 +1,169 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import heapq
+import itertools
+import threading
+import time
+
+import call_nanotts
+import metrics
+
+# lower numbers are spoken first
+PRIORITY_BUTTON = 0
+PRIORITY_RESULT = 1
+
+
+class SpeechQueue:
+    """
+Speaks texts in a thread, so the capture and ocr loop keeps running while nanoTTS talks.
+Texts are spoken by priority, then in order. A text with a key replaces a queued text with the same key,
+so a newer result of a microwave countdown supersedes the stale one that did not get spoken yet.
+    """
+
+    def __init__(self, nanotts_options, speak=call_nanotts.start_nanotts):
+        """
+        :param nanotts_options: flags for nanoTTS, used for the texts queued without their own flags
+        :param speak: function(nanotts_options, text) that starts speaking and returns a subprocess.Popen or None
+        """
+        self._nanotts_options = nanotts_options
+        self._speak = speak
+        # heap of (priority, order, key, text, nanotts options)
+        self._queue = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # (priority, key, Popen) of the text being spoken, Popen is None while it is rendered and started
+        self._current = None
+        # the current text is being started, and was cancelled meanwhile
+        self._starting = False
+        self._interrupted = False
+        self._running = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.spoken = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        return self
+
+    def say(self, text, priority=PRIORITY_RESULT, key=None, interrupt=False, nanotts_options=None):
+        """
+Queues a text and returns at once.
+        :param text: the String to speak
+        :param priority: PRIORITY_BUTTON or PRIORITY_RESULT
+        :param key: texts with the same key replace each other while queued, None to never replace
+        :param interrupt: cancel the text being spoken if its priority is not higher
+        :param nanotts_options: flags for nanoTTS for this text, e.g. the voice of one of several devices
+        """
+        with self._wakeup:
+            if key is not None:
+                self._drop(key)
+            heapq.heappush(self._queue, (priority, next(self._order), key, text, nanotts_options))
+            if interrupt and self._current is not None and self._current[0] >= priority:
+                self._terminate()
+            self._wakeup.notify()
+
+    def cancel(self, key=None):
+        """
+Drops queued texts and stops the text being spoken.
+        :param key: only cancel texts with this key, None cancels everything
+        """
+        with self._wakeup:
+            if key is None:
+                self.cancelled += len(self._queue)
+                self._queue = []
+            else:
+                self.cancelled += self._drop(key)
+            if self._current is not None and (key is None or self._current[1] == key):
+                self._terminate()
+
+    def pending(self):
+        """
+        :return: number of queued texts, including the one being spoken
+        """
+        with self._lock:
+            return len(self._queue) + (self._current is not None)
+
+    def stop(self):
+        with self._wakeup:
+            self._running = False
+            self._queue = []
+            if self._current is not None:
+                self._terminate()
+            self._wakeup.notify_all()
+        self._thread.join()
+
+    def _drop(self, key):
+        # called with the lock held, returns the number of dropped texts
+        length = len(self._queue)
+        self._queue = [entry for entry in self._queue if entry[2] != key]
+        dropped = length - len(self._queue)
+        if dropped:
+            heapq.heapify(self._queue)
+            self.coalesced += dropped
+        return dropped
+
+    def _terminate(self):
+        # called with the lock held
+        if self._starting:
+            # _run stops the text as soon as it is started
+            if not self._interrupted:
+                self._interrupted = True
+                self.cancelled += 1
+            return
+        process = self._current[2]
+        if process is not None and process.poll() is None:
+            process.terminate()
+            self.cancelled += 1
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                self._wakeup.wait_for(lambda: self._queue or not self._running)
+                if not self._running:
+                    return
+                priority, _, key, text, nanotts_options = heapq.heappop(self._queue)
+                # current before it is started, so cancel() never misses a text that just left the queue
+                self._current = (priority, key, None)
+                self._starting = True
+                self._interrupted = False
+            # a text that is not cached is rendered by nanoTTS first, without the lock, so say() does not wait for it
+            started = time.perf_counter()
+            try:
+                process = self._speak(nanotts_options or self._nanotts_options, text)
+            except Exception as e:
+                # e.g. an I/O error of the speech cache, the next texts are still spoken
+                print("Can't speak {!r}: {}".format(text, e))
+                with self._wakeup:
+                    self._starting = False
+                    self._current = None
+                continue
+            with self._wakeup:
+                self._starting = False
+                self._current = (priority, key, process)
+                if self._interrupted or not self._running:
+                    # cancelled while it was started
+                    if process is not None and process.poll() is None:
+                        process.terminate()
+            if process is not None:
+                process.wait()
+            # synthesis and playback, it runs beside the stages of the main loop
+            metrics.observe("speech", time.perf_counter() - started)
+            with self._wakeup:
+                self._current = None
+                self.spoken += 1
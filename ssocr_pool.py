@@ -0,0 +1,192 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import struct
+import subprocess
+import threading
+import time
+
+# A request on the pipe is one binary frame:
+#   4 bytes  big endian length of the argument block
+#   n bytes  ssocr arguments, utf-8, separated by \0
+#   rest     the roi as binary PGM (P5) or PPM (P6) image
+# The answer is the utf-8 encoded stdout of ssocr.
+_HEADER = struct.Struct("!I")
+
+
+def encode_pnm(img):
+    """
+Encodes an image as uncompressed PGM, or PPM for color images. No compression, just a header in front of the pixels.
+    :param img: image in CV2-MAT format
+    :return: the image as bytes
+    """
+    if img.ndim == 3:
+        # PPM stores RGB, OpenCV uses BGR
+        return b"P6\n%d %d\n255\n" % (img.shape[1], img.shape[0]) + img[:, :, 2::-1].tobytes()
+    return b"P5\n%d %d\n255\n" % (img.shape[1], img.shape[0]) + img.tobytes()
+
+
+def encode_request(ssocr_args, img):
+    """
+Packs the ssocr arguments and the roi into one request frame.
+    :param ssocr_args: list of ssocr arguments, without "ssocr" and "-"
+    :param img: the roi in CV2-MAT format
+    :return: the request as bytes
+    """
+    args_block = "\0".join(ssocr_args).encode("utf-8")
+    return _HEADER.pack(len(args_block)) + args_block + encode_pnm(img)
+
+
+def decode_request(frame):
+    """
+Unpacks a request frame.
+    :param frame: the request as bytes
+    :return: tuple of the ssocr argument list and the image as PNM bytes
+    """
+    args_length = _HEADER.unpack_from(frame)[0]
+    args_block = frame[_HEADER.size:_HEADER.size + args_length].decode("utf-8")
+    ssocr_args = args_block.split("\0") if args_block else []
+    return ssocr_args, frame[_HEADER.size + args_length:]
+
+
+def _worker_loop(conn):
+    """
+Main loop of a worker process, runs ssocr for every request frame until the pipe is closed.
+    :param conn: worker end of the pipe
+    """
+    # the worker leads its own process group, the ssocr it runs is in that group as well,
+    # so a worker that timed out is killed together with its ssocr
+    os.setpgrp()
+    while True:
+        try:
+            frame = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+        ssocr_args, image = decode_request(frame)
+        try:
+            p = subprocess.Popen(["ssocr"] + ssocr_args + ["-"],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = p.communicate(image)
+        except OSError as e:
+            print("Error during ssocr call in worker: {}".format(e))
+            out = b""
+        conn.send_bytes(out)
+
+
+class SsocrWorkerPool:
+    """
+Long-lived worker processes that receive rois as raw PGM frames over pipes and answer with the ssocr output.
+No PNG encoding is needed, and all rois of a frame are recognized in parallel, so the latency of a frame does not
+grow with the number of rois. ssocr has no mode to read several images, so every roi still forks ssocr in a worker;
+the pool only pays off with a core per worker, on a single core the serial backend is faster,
+see dev/ssocr_pool_benchmark.py.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self._size = workers or multiprocessing.cpu_count()
+        # seconds to wait for a single roi, a worker that does not answer in time is replaced
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._workers = [self._start_worker() for _ in range(self._size)]
+
+    @staticmethod
+    def _start_worker():
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    @staticmethod
+    def _kill(process):
+        # kills the process group of the worker, with the ssocr that hangs
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        process.join(1)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _replace(self, worker):
+        process, conn = self._workers[worker]
+        conn.close()
+        self._kill(process)
+        self._workers[worker] = self._start_worker()
+
+    def map(self, ssocr_args, imgs):
+        """
+Hands the rois to the workers and gathers the results. Every worker has one roi in flight and gets the next one
+when it answered, so no worker blocks on a full pipe and the timeout covers the whole exchange of a roi.
+        :param ssocr_args: list of ssocr arguments, "ssocr" and "-" are stripped
+        :param imgs: list of rois in CV2-MAT format, None entries are answered with ""
+        :return: list of ssocr outputs in the order of the rois, None for rois that timed out or failed
+        """
+        ssocr_args = [arg for arg in ssocr_args if arg not in ("ssocr", "-")]
+        results = [""] * len(imgs)
+        pending = collections.deque(index for index, img in enumerate(imgs) if img is not None)
+        with self._lock:
+            # worker -> (index of its roi, deadline)
+            busy = {}
+            while pending or busy:
+                for worker in range(self._size):
+                    if not pending:
+                        break
+                    if worker in busy:
+                        continue
+                    index = pending.popleft()
+                    results[index] = None
+                    try:
+                        self._workers[worker][1].send_bytes(encode_request(ssocr_args, imgs[index]))
+                    except OSError as e:
+                        print("ssocr worker {} died: {}".format(worker, e))
+                        self._replace(worker)
+                        continue
+                    busy[worker] = (index, None if self.timeout is None else time.monotonic() + self.timeout)
+
+                conns = dict((self._workers[worker][1], worker) for worker in busy)
+                deadlines = [deadline for _, deadline in busy.values() if deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                for conn in multiprocessing.connection.wait(list(conns), timeout):
+                    worker = conns[conn]
+                    index = busy.pop(worker)[0]
+                    try:
+                        results[index] = conn.recv_bytes().decode("utf-8")
+                    except (EOFError, OSError) as e:
+                        print("ssocr worker {} died: {}".format(worker, e))
+                        self._replace(worker)
+
+                now = time.monotonic()
+                for worker, (index, deadline) in list(busy.items()):
+                    if deadline is not None and deadline <= now:
+                        print("ssocr worker {} timed out after {} s.".format(worker, self.timeout))
+                        del busy[worker]
+                        self._replace(worker)
+        return results
+
+    def close(self):
+        """
+Closes the pipes, the workers exit when their pipe is closed.
+        """
+        for process, conn in self._workers:
+            conn.close()
+            process.join(1)
@@ -0,0 +1,345 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import multiprocessing
+import pickle
+import struct
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import calibration
+import device_profile
+import drift_monitor
+import metrics
+import opencv_webcam_multithread
+import replay
+
+# bytes per slot for the pickled description of the arrays in the slot
+HEADER_SIZE = 4096
+_LENGTH = struct.Struct("<I")
+# indices into the shared state of a SharedRing
+_HEAD, _TAIL, _DROPPED, _CLOSED = range(4)
+
+
+class SharedRing:
+    """
+Bounded queue of numpy arrays between processes. The arrays are copied into the slots of one
+multiprocessing.shared_memory block, only a small pickled header per slot describes their shapes, so nothing
+but the header is pickled. A full ring drops its oldest entry, so a slow consumer always gets a recent frame
+and the latency stays bounded by the depth. With block=True put waits for a free slot instead, e.g. to replay
+every frame of a video.
+The ring is handed to the processes of the stages when they are started.
+    """
+
+    def __init__(self, slot_size, depth=2):
+        """
+        :param slot_size: bytes of the arrays of one entry at most
+        :param depth: number of entries in flight
+        """
+        self.slot_size = slot_size
+        self.depth = depth
+        self._stride = HEADER_SIZE + slot_size
+        self._shm = shared_memory.SharedMemory(create=True, size=self._stride * depth)
+        self._changed = multiprocessing.Condition()
+        # head and tail count the entries taken and put, the slot of an entry is its number modulo depth
+        self._state = multiprocessing.RawArray("q", 4)
+
+    def put(self, arrays, meta=None, block=False, timeout=None):
+        """
+        :param arrays: list of numpy arrays, copied into the ring
+        :param meta: small picklable object passed along, e.g. the frame number
+        :param block: wait for a free slot instead of dropping the oldest entry
+        :param timeout: seconds to wait at most with block
+        :return: False if the ring is closed or the wait timed out
+        """
+        with self._changed:
+            state = self._state
+            if block and not self._changed.wait_for(
+                    lambda: state[_TAIL] - state[_HEAD] < self.depth or state[_CLOSED], timeout):
+                return False
+            if state[_CLOSED]:
+                return False
+            if state[_TAIL] - state[_HEAD] >= self.depth:
+                state[_HEAD] += 1
+                state[_DROPPED] += 1
+            self._write(state[_TAIL] % self.depth, arrays, meta)
+            state[_TAIL] += 1
+            self._changed.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """
+        :param timeout: seconds to wait at most for an entry
+        :return: tuple of the list of arrays and meta, None if the ring is empty after the timeout
+        """
+        with self._changed:
+            state = self._state
+            if not self._changed.wait_for(lambda: state[_TAIL] > state[_HEAD] or state[_CLOSED], timeout) \
+                    or state[_TAIL] == state[_HEAD]:
+                return None
+            entry = self._read(state[_HEAD] % self.depth)
+            state[_HEAD] += 1
+            self._changed.notify_all()
+        return entry
+
+    def _write(self, slot, arrays, meta):
+        base = slot * self._stride
+        layout = []
+        position = 0
+        for array in arrays:
+            array = np.asarray(array)
+            if position + array.nbytes > self.slot_size:
+                raise ValueError("Entry of more than {} bytes does not fit into the ring".format(self.slot_size))
+            np.ndarray(array.shape, array.dtype, self._shm.buf, base + HEADER_SIZE + position)[...] = array
+            layout.append((array.shape, array.dtype.str, position))
+            # keep the arrays aligned
+            position += -(-array.nbytes // 8) * 8
+        header = pickle.dumps((layout, meta))
+        if len(header) > HEADER_SIZE - _LENGTH.size:
+            raise ValueError("Header of {} bytes does not fit into the ring".format(len(header)))
+        _LENGTH.pack_into(self._shm.buf, base, len(header))
+        self._shm.buf[base + _LENGTH.size:base + _LENGTH.size + len(header)] = header
+
+    def _read(self, slot):
+        # the arrays are copied out, the slot is free for the producer once the lock is released
+        base = slot * self._stride
+        length = _LENGTH.unpack_from(self._shm.buf, base)[0]
+        layout, meta = pickle.loads(self._shm.buf[base + _LENGTH.size:base + _LENGTH.size + length])
+        arrays = [np.ndarray(shape, dtype, self._shm.buf, base + HEADER_SIZE + position).copy()
+                  for shape, dtype, position in layout]
+        return arrays, meta
+
+    @property
+    def dropped(self):
+        """
+        :return: number of entries dropped because the ring was full
+        """
+        return self._state[_DROPPED]
+
+    def close(self):
+        """
+Marks the end of the entries, get returns the queued ones and then None without waiting.
+        """
+        with self._changed:
+            self._state[_CLOSED] = 1
+            self._changed.notify_all()
+
+    def finished(self):
+        """
+        :return: True if the ring is closed and empty
+        """
+        with self._changed:
+            return bool(self._state[_CLOSED]) and self._state[_TAIL] == self._state[_HEAD]
+
+    def release(self):
+        """
+Frees the shared memory, called by the process that created the ring once all stages stopped.
+        """
+        self._shm.close()
+        self._shm.unlink()
+
+
+def probe_frame_shape(args):
+    """
+Reads one frame of the cam or the video to size the rings.
+    :param args: parsed arguments of ansprakon.build_parser()
+    :return: shape of the frames
+    """
+    source = args.replay if args.replay is not None else args.cam
+    stream = cv2.VideoCapture(source)
+    (grabbed, frame) = stream.read()
+    stream.release()
+    if not grabbed:
+        raise ValueError("Can't read a frame from {}".format(source))
+    return frame.shape
+
+
+def _capture(args, frames, stopped):
+    # capture process: decodes the frames of the cam or the video into the frame ring
+    recording = args.replay is not None
+    if recording:
+        stream = replay.VideoFileStream(args.replay)
+    else:
+        stream = opencv_webcam_multithread.WebcamVideoStream(src=args.cam, mode=args.capture_mode,
+                                                             fps=args.fps).start()
+    seq = None
+    try:
+        while not stopped.is_set():
+            (new_seq, frame) = stream.read_seq()
+            if frame is None or new_seq == seq:
+                if recording and stream.finished:
+                    break
+                stream.wait(seq, 1.0)
+                continue
+            seq = new_seq
+            # a recording is replayed completely, the cam drops the oldest frame if the vision stage lags
+            frames.put([frame], seq, block=recording)
+    finally:
+        stream.stop()
+        frames.close()
+
+
+def _flatten(rois):
+    # the rois as flat list of arrays and the layout to rebuild them, an int for a nested list of that many arrays,
+    # e.g. [[alarm_1, alarm_2, freq_shown]] of the feat-rois of device 5, True for an array and False for None
+    arrays = []
+    layout = []
+    for roi in rois:
+        if isinstance(roi, list):
+            arrays.extend(roi)
+            layout.append(len(roi))
+        else:
+            if roi is not None:
+                arrays.append(roi)
+            layout.append(roi is not None)
+    return arrays, layout
+
+
+def _unflatten(arrays, layout):
+    # inverse of _flatten
+    rois = []
+    position = 0
+    for entry in layout:
+        if entry is True:
+            rois.append(arrays[position])
+            position += 1
+        elif entry is False:
+            rois.append(None)
+        else:
+            rois.append(arrays[position:position + entry])
+            position += entry
+    return rois
+
+
+def _vision(args, frames, rois, stopped):
+    # preprocessing and roi process: turns the frames into the rois of the device
+    pipeline = device_profile.load(args.device, args.profiles)
+    device_calibration = calibration.Calibration(calibration.path_for(args))
+    pipeline.set_correction(device_calibration.correction())
+    monitor = drift_monitor.DriftMonitor(args.drift_interval, args.drift_tolerance) if args.drift_interval else None
+    recording = args.replay is not None
+    try:
+        while not stopped.is_set():
+            entry = frames.get(1.0)
+            if entry is None:
+                if frames.finished():
+                    break
+                continue
+            (frame,), seq = entry
+            if monitor is not None:
+                drift_monitor.correct(monitor, frame, device_calibration, pipeline)
+            preprocessed_image = pipeline.preprocess(frame)
+            rois_cut = pipeline.cut_rois(preprocessed_image)
+            ocr_arrays, ocr_layout = _flatten(rois_cut[0])
+            feat_arrays, feat_layout = _flatten(rois_cut[1])
+            images = preprocessed_image if isinstance(preprocessed_image, list) else [preprocessed_image]
+            rois.put(ocr_arrays + feat_arrays + images,
+                     (seq, ocr_layout, feat_layout, len(ocr_arrays), len(feat_arrays),
+                      isinstance(preprocessed_image, list)),
+                     block=recording)
+    finally:
+        rois.close()
+
+
+class StagedPipeline:
+    """
+Runs the capture and the vision stages (preprocess_image and cut_rois) of a device in two processes,
+the ocr and result stages stay in the calling process. The stages are connected by SharedRing queues,
+so up to three frames are processed at the same time on different cores.
+It takes the place of the cam of Ansprakon, the rois are handed over with Ansprakon.take_rois.
+    """
+
+    def __init__(self, args, depth=2):
+        """
+        :param args: parsed arguments of ansprakon.build_parser()
+        :param depth: number of frames in flight between two stages
+        """
+        frame_bytes = int(np.prod(probe_frame_shape(args)))
+        self.frames = SharedRing(frame_bytes, depth)
+        # the rois and the preprocessed image are gray cuts of the frame, twice the frame is plenty
+        self.rois = SharedRing(2 * frame_bytes, depth)
+        self._stopped = multiprocessing.Event()
+        self._processes = [
+            multiprocessing.Process(target=_capture, args=(args, self.frames, self._stopped), daemon=True),
+            multiprocessing.Process(target=_vision, args=(args, self.frames, self.rois, self._stopped),
+                                    daemon=True)]
+        self._dropped = 0
+        self.finished = False
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+        return self
+
+    def read(self, timeout=1.0):
+        """
+        :param timeout: seconds to wait at most for the rois of a frame
+        :return: tuple of the frame number, the preprocessed image and the rois [[ocr-rois], [feat-rois]],
+        None if there was nothing within the timeout or the stages finished
+        """
+        entry = self.rois.get(timeout)
+        dropped = self.frames.dropped + self.rois.dropped
+        if dropped != self._dropped:
+            metrics.inc(metrics.DROPPED_FRAMES, dropped - self._dropped)
+            self._dropped = dropped
+        if entry is None:
+            self.finished = self.rois.finished()
+            return None
+        arrays, (seq, ocr_layout, feat_layout, ocr_count, feat_count, is_list) = entry
+        rois_cut = [_unflatten(arrays[:ocr_count], ocr_layout),
+                    _unflatten(arrays[ocr_count:ocr_count + feat_count], feat_layout)]
+        images = arrays[ocr_count + feat_count:]
+        return seq, images if is_list else images[0], rois_cut
+
+    def stop(self):
+        self._stopped.set()
+        # unblock a producer that waits for a free slot
+        self.frames.close()
+        self.rois.close()
+        for process in self._processes:
+            process.join(2.0)
+            if process.is_alive():
+                process.terminate()
+        self.frames.release()
+        self.rois.release()
+
+
+def run(ansprakon, staged, record=None):
+    """
+Runs the ocr and result stages on the rois of the staged pipeline until it finishes.
+With --min-rate or --max-rate the scheduler of ansprakon paces these stages, the capture and vision processes
+keep running at the rate of the cam and the rois queued while waiting are skipped for the newest.
+    :param ansprakon: Ansprakon reading from staged
+    :param staged: started StagedPipeline
+    :param record: optional function(stage, seconds) called with the duration of every step
+    :return: number of processed frames
+    """
+    frames = 0
+    while not staged.finished:
+        ansprakon.wait_for_schedule()
+        entry = staged.read()
+        if entry is None:
+            continue
+        if ansprakon.paced:
+            newer = staged.read(0)
+            while newer is not None:
+                entry, newer = newer, staged.read(0)
+        ansprakon.take_rois(*entry)
+        ansprakon.step(record, ansprakon.RESULT_STAGES)
+        ansprakon.sdnotify.notify("WATCHDOG=1")
+        frames += 1
+    return frames
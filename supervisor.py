@@ -0,0 +1,145 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import argparse
+import json
+
+import ansprakon
+import calibration
+import metrics
+import opencv_webcam_multithread
+
+# seconds to wait for a cam when no pipeline had a new frame
+IDLE_WAIT = 0.02
+
+
+class Supervisor:
+    """
+Runs the pipelines of several devices and cams in one process. They share the interpreter and OpenCV,
+the ocr backend of call_ssocr, one speech queue and the cam thread of pipelines with the same cam index.
+Frames are scheduled round robin, every pass gives each pipeline at most one new frame,
+so a device with a fast cam or cheap rois can't starve the others.
+The ocr, speech engine and metrics flags of the first pipeline apply to the whole process.
+--calibrate calibrates a pipeline before the cams are started, --staged is not possible in a shared process.
+    """
+
+    def __init__(self, argv_lists):
+        """
+        :param argv_lists: list of command lines of ansprakon.py without the program name, one per pipeline
+        """
+        if not argv_lists:
+            raise ValueError("No pipelines configured")
+        parser = ansprakon.build_parser()
+        self.args = [parser.parse_args(argv) for argv in argv_lists]
+        for args in self.args:
+            if args.staged:
+                parser.error("--staged can't be used for the pipeline of device {} in a supervisor, "
+                             "run it with ansprakon.py".format(args.device))
+        for args in self.args:
+            if args.calibrate:
+                try:
+                    calibration.calibrate(args)
+                except ValueError as e:
+                    print("Calibration of device {} failed: {}".format(args.device, e))
+        first = self.args[0]
+        ansprakon.configure_ocr(first)
+        self.speech = ansprakon.start_speech(first, [args.device for args in self.args])
+        # cam index -> started WebcamVideoStream
+        self._cams = {}
+        self.pipelines = [ansprakon.Ansprakon(args, self._cam(args), self.speech) for args in self.args]
+        self._turn = 0
+
+    def _cam(self, args):
+        # a recorded video is read by one pipeline only, every read takes the next frame of the file
+        if args.replay is not None:
+            return None
+        cam = self._cams.get(args.cam)
+        if cam is None:
+            cam = self._cams[args.cam] = opencv_webcam_multithread.WebcamVideoStream(
+                src=args.cam, mode=args.capture_mode, fps=args.fps).start()
+        return cam
+
+    def finished(self):
+        """
+        :return: True if every pipeline replays a video and all videos are at their end
+        """
+        return all(getattr(pipeline.cam, "finished", False) for pipeline in self.pipelines)
+
+    def run_once(self, record=None):
+        """
+One round robin pass over the pipelines, each processes its newest frame if it has not seen it yet
+and its frame scheduler wants the next frame.
+        :param record: optional function(stage, seconds) called with the duration of every step
+        :return: number of processed frames
+        """
+        processed = 0
+        for pipeline in self.pipelines:
+            if pipeline.frame_due() and pipeline.get_frame():
+                pipeline.step(record)
+                processed += 1
+        if processed:
+            self.pipelines[0].sdnotify.notify("WATCHDOG=1")
+        else:
+            # wait on the cams in turn, returns at once if that cam already has a new frame
+            self.pipelines[self._turn % len(self.pipelines)].wait_for_frame(IDLE_WAIT)
+            self._turn += 1
+        return processed
+
+    def run(self):
+        record = metrics.observe if metrics.enabled() else None
+        while not self.finished():
+            self.run_once(record)
+
+    def stop(self):
+        for pipeline in self.pipelines:
+            pipeline.cam.stop()
+        self.speech.stop()
+
+
+def load(path):
+    """
+Reads the pipelines from a json file, a list of command lines of ansprakon.py, e.g.
+[["9", "-f", "-c", "0"], ["4", "-c", "1", "-l", "en-GB"]]
+    :param path: path of the json file
+    :return: list of argv lists
+    """
+    with open(path) as config_file:
+        argv_lists = json.load(config_file)
+    if not isinstance(argv_lists, list) or not all(isinstance(argv, list) for argv in argv_lists):
+        raise ValueError("{} must hold a list of command lines".format(path))
+    return [[str(arg) for arg in argv] for argv in argv_lists]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run several devices and cams in one process")
+    parser.add_argument("pipelines", help="json file with a list of ansprakon.py command lines, one per device")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(load(args.pipelines))
+    first = supervisor.args[0]
+    if first.metrics_port is not None:
+        metrics.serve(first.metrics_port)
+    if first.metrics_file is not None:
+        metrics.write_periodically(first.metrics_file, first.metrics_interval)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+if __name__ == '__main__':
+    main()
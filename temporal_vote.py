@@ -0,0 +1,97 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import math
+
+import seven_segment
+
+# characters a position can take: digits, letters of the charset, "-", "." and " " for an unlit position
+ALPHABET_SIZE = 24
+# accuracy of a reading with confidence 0 and 1
+MIN_ACCURACY = 0.5
+MAX_ACCURACY = 0.95
+
+
+class TemporalVoter:
+    """
+Fuses the ocr strings of the last frames per roi and character position.
+Every reading of a character is evidence weighted by the confidence of its roi, see seven_segment.confidence.
+With a uniform prior over the characters, the posterior of a character is proportional to the product of
+acc for the readings that agree and (1 - acc) / (ALPHABET_SIZE - 1) for the ones that don't, acc being the
+accuracy of the reading. A result is stable once every position of every roi passes the threshold,
+so one misread segment lowers the posterior of a position but doesn't reset the agreement.
+    """
+
+    def __init__(self, threshold=0.99, window=8):
+        """
+        :param threshold: posterior every character must reach
+        :param window: number of frames voting
+        """
+        self.threshold = threshold
+        self._frames = collections.deque(maxlen=window)
+
+    @staticmethod
+    def _log_odds(confidence):
+        # log of the likelihood ratio of a correct reading to one specific wrong character
+        accuracy = MIN_ACCURACY + (MAX_ACCURACY - MIN_ACCURACY) * min(max(confidence, 0.0), 1.0)
+        return math.log(accuracy * (ALPHABET_SIZE - 1) / (1.0 - accuracy))
+
+    def reset(self):
+        self._frames.clear()
+
+    def update(self, ocr_results, confidences):
+        """
+Adds the ocr results of a frame and fuses the window.
+        :param ocr_results: list of ssocr outputs, one per roi
+        :param confidences: list of the confidences of the rois
+        :return: list of fused ssocr outputs if they are stable, else None
+        """
+        self._frames.append([(result.rstrip(), self._log_odds(confidence))
+                             for result, confidence in zip(ocr_results, confidences)])
+        fused = []
+        for roi in range(len(ocr_results)):
+            text = self._fuse([frame[roi] for frame in self._frames if roi < len(frame)])
+            if text is None:
+                return None
+            fused.append(text + "\n" if text else "")
+        return fused
+
+    def _fuse(self, readings):
+        """
+        :param readings: list of (text, log odds) of one roi
+        :return: the fused text, None if a position is below the threshold
+        """
+        # failed and unreadable readings are no evidence
+        readings = [(text, weight) for text, weight in readings if text and seven_segment.UNKNOWN_CHAR not in text]
+        if not readings:
+            return None
+        # digits are right aligned on the displays, missing leading digits are unlit
+        length = max(len(text) for text, _ in readings)
+        fused = ""
+        for position in range(length):
+            evidence = collections.defaultdict(float)
+            for text, weight in readings:
+                evidence[text.rjust(length)[position]] += weight
+            # posterior of a character: exp(evidence) over the sum for all characters,
+            # the characters without readings have evidence 0
+            best = max(evidence, key=evidence.get)
+            top = evidence[best]
+            total = sum(math.exp(value - top) for value in evidence.values()) \
+                + (ALPHABET_SIZE - len(evidence)) * math.exp(-top)
+            if 1.0 / total < self.threshold:
+                return None
+            fused += best
+        return fused.strip()
@@ -0,0 +1,68 @@
+# coding=utf-8
+# This file is part of AnSpraKon.
+#
+# AnSpraKon is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# AnSpraKon is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with AnSpraKon.  If not, see <http://www.gnu.org/licenses/>.
+import cv2
+import numpy as np
+
+
+class Workspace:
+    """
+Named arrays that are allocated on the first frame and reused by every following frame.
+The cv2 functions write into them through their dst argument, so the steady-state loop allocates nothing.
+An array is only allocated again if the shape of a frame changes.
+The arrays are overwritten by the next frame, everything derived from them has to be done within the frame.
+    """
+
+    def __init__(self):
+        self._arrays = {}
+        # number of arrays allocated so far, stays constant once all frames have the same shape
+        self.allocations = 0
+
+    def array(self, name, shape, dtype=np.uint8, fill=None):
+        """
+        :param name: name of the array, unique within the workspace
+        :param shape: shape of the array
+        :param dtype: numpy dtype of the array
+        :param fill: value the array is filled with when it is allocated, None to leave it uninitialized
+        :return: the array
+        """
+        shape = tuple(shape)
+        buffer = self._arrays.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype) if fill is None else np.full(shape, fill, dtype)
+            self._arrays[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    def bordered(self, name, shape, border, value=255):
+        """
+An array with a constant border, like cv2.copyMakeBorder with BORDER_CONSTANT.
+The border is filled once when the array is allocated, only the interior is written on every frame.
+        :param name: name of the array
+        :param shape: shape of the interior
+        :param border: width of the border on all four sides
+        :param value: value of the border
+        :return: tuple of the whole array and the view of its interior
+        """
+        height, width = shape[:2]
+        buffer = self.array(name, (height + 2 * border, width + 2 * border) + tuple(shape[2:]), fill=value)
+        return buffer, buffer[border:border + height, border:border + width]
+
+    def dilate(self, name, src, kernel, iterations=1):
+        """
+cv2.dilate into the array of the name.
+        :return: the dilated array
+        """
+        return cv2.dilate(src, kernel, dst=self.array(name, src.shape, src.dtype), iterations=iterations)